@@ -1,105 +1,279 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import RedirectResponse
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth
-import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, RedirectResponse, StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+import time
 import logging
-from app.services.voice_recognition import recognize_speech
-from app.services.command_parser import parse_command
-from app.services.spotify_auth import get_spotify_token, play_spotify_song
-import spotipy
+from app.services.command_parser import parse_command, execute_command, COMMAND_HANDLERS
+from app.services.spotify_auth import get_spotify_token_async, token_manager
 import json 
-from app.services.spotify_service import get_spotify_devices, play_song_on_spotify
+from app.services.spotify_service import get_spotify_devices, spotify_error
+from app.services.spotify_client import spotify_client, SpotifyException
+from app.services.play_pipeline import play_track, play_uri, describe_play_result
+from app.services.search_cache import search_track, make_key
+from app.services.search_response import parse_fields, project, dumps, make_etag, etag_matches
+from app.services.track_index import track_index, sync_from_spotify
+from app.services.timing import StageTimer
+from app.services.audio_ingest import read_audio_upload, MAX_AUDIO_SECONDS, UploadLimitMiddleware, max_upload_bytes
+from app.services.voice_recognition import recognition_cache
+from app.services.recognition_pool import recognition_pool, RecognitionPoolFull, RecognitionTimeout
+from app.services.voice_stream import VoiceStreamSession
+from app.services.batch import run_batch, BATCH_MAX_ITEMS
+from app.services.metrics import registry, MetricsMiddleware
+from app.services.profiler import profiler, DEBUG_ENDPOINTS
+from app.services.logging_setup import configure_logging, log_payload
+from app.services.user_session import UserSessionMiddleware, MULTI_USER, SESSION_COOKIE, new_session_id, current_user
+from app.services.playback_queue import playback_queue, PlaybackQueueFull
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO)
-TOKEN_STORAGE_FILE = "token_info.json"
+# Initialize logging: records go through a queue to a background writer
+configure_logging()
 
-app = FastAPI(title="Music Assistant API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client for all Spotify calls, opened and closed with the app
+    await spotify_client.start()
+    track_index.load()
+    # The server starts accepting connections right away; /health reports
+    # 503 until the warm-up has finished
+    app.state.ready = False
+    warm_up_task = asyncio.create_task(warm_up(app))
+    yield
+    warm_up_task.cancel()
+    playback_queue.close()
+    await spotify_client.close()
+    track_index.close()
+    recognition_pool.shutdown()
+    token_manager.close()
 
-# Load environment variables
-SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
-SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
-SPOTIPY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI")
+async def warm_up(app):
+    """Do the first request's setup work before traffic arrives."""
+    start = time.perf_counter()
+    steps = (
+        ("tokens", lambda: asyncio.to_thread(token_manager.warm_up)),
+        ("recognizer", recognition_pool.warm_up),
+        ("spotify_connections", spotify_client.warm_up),
+    )
+    timings = {}
+    for name, step in steps:
+        step_start = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            # A failed step only costs the first request its speed-up, so still become ready
+            logging.warning("Warm-up step failed", extra={"step": name, "error": str(e)})
+        timings[name] = round((time.perf_counter() - step_start) * 1000, 2)
+    app.state.ready = True
+    logging.info("Warm-up complete", extra={**timings, "total": round((time.perf_counter() - start) * 1000, 2)})
+    # Seeding the track index can take a while; it doesn't hold up readiness
+    await sync_track_index()
 
-scope = "user-modify-playback-state user-read-playback-state user-read-currently-playing user-library-read"
+async def sync_track_index():
+    # Seed the local track index from the user's library in the background
+    access_token = await get_spotify_token_async()
+    if not access_token:
+        return
+    try:
+        await sync_from_spotify(track_index, spotify_client.for_token(access_token))
+    except Exception as e:
+        logging.warning("Track index sync failed", extra={"error": str(e)})
+
+app = FastAPI(title="Music Assistant API", lifespan=lifespan)
+# Oversized uploads are turned away before the multipart body is spooled
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/voice-command": max_upload_bytes(),
+    "/voice-command/batch": max_upload_bytes(files=BATCH_MAX_ITEMS),
+})
+app.add_middleware(UserSessionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-# Create SpotifyOAuth instance
-def create_spotify_oauth():
-    return SpotifyOAuth(
-        client_id=SPOTIPY_CLIENT_ID,
-        client_secret=SPOTIPY_CLIENT_SECRET,
-        redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope=scope
-    )
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Music Assistant API"}
 
+async def run_playback_command(command):
+    if command["action"] == "play":
+        access_token = await get_spotify_token_async()
+        result = await play_track(access_token, command["song_name"], command.get("artist_name"),
+                                  alternatives=command.get("alternatives"))
+        logging.info("Voice command played", extra={"status": result["status"]})
+        return describe_play_result(result)
+    return await execute_command(command)
+
+def submit_playback(command, handler, queue_key=None):
+    # Queued per user, not per access token: a token refresh must not start a
+    # second worker for the same device. Handlers fetch the token when they run.
+    try:
+        return playback_queue.submit(queue_key or current_user.get(), command, handler)
+    except PlaybackQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def accepted(job, **fields):
+    """202 for a queued playback command; the client polls status_url for the outcome."""
+    return JSONResponse({**fields, "job_id": job.id, "status": job.status, "command": job.command,
+                         "status_url": f"/playback/jobs/{job.id}"}, status_code=202)
+
+async def wait_for_playback(job):
+    job = await playback_queue.wait(job)
+    if job.status == "failed":
+        raise HTTPException(status_code=job.status_code, detail=job.error)
+    return job.result
+
 @app.post("/voice-command")
-async def process_voice_command(audio: UploadFile = File(...)):
+async def process_voice_command(audio: UploadFile = File(...), wait: bool = False):
+    """Recognize a spoken command and run it.
+
+    Playback commands are queued per device and answered with 202 and a
+    job id right away; pass wait=true to get the outcome in the response.
+    """
+    timer = StageTimer()
     try:
-        audio_data = await audio.read()
-        recognized_text = recognize_speech(audio_data)
-        logging.info(f"Recognized text: {recognized_text}")
+        with timer.stage("upload"):
+            audio_file, audio_info = await read_audio_upload(audio)
+        with timer.stage("recognition"):
+            try:
+                recognition = await recognition_pool.submit(audio_file, max_seconds=MAX_AUDIO_SECONDS)
+            except RecognitionPoolFull as e:
+                raise HTTPException(status_code=503, detail="Speech recognition is busy, try again later",
+                                    headers={"Retry-After": str(e.retry_after)})
+            except RecognitionTimeout as e:
+                raise HTTPException(status_code=504, detail=str(e))
+        recognized_text = recognition.pop("text")
+        logging.info("Recognized text", extra={"text": recognized_text, **recognition})
 
         if recognized_text.startswith("Error"):
-            logging.error(f"Recognition error: {recognized_text}")
+            logging.error("Recognition error", extra={"error": recognized_text})
             raise HTTPException(status_code=400, detail=recognized_text)
 
-        command_response = parse_command(recognized_text)
-        logging.info(f"Parsed command: {command_response}")
+        with timer.stage("parse"):
+            command_response = parse_command(recognized_text)
+        logging.info("Parsed command", extra={"action": command_response.get("action")})
 
-        if command_response.get("action") == "play":
+        if command_response.get("action") in COMMAND_HANDLERS:
             # Check if a valid token exists
-            token_info = get_spotify_token()
-            if not token_info:
-                logging.error("No access token, redirecting to login.")
-                return RedirectResponse(url="/login", status_code=302)
-            
-            # Get device associated with the user's account
-            devices = get_spotify_devices(token_info['access_token'])
-            if not devices or not isinstance(devices, list) or not all(isinstance(device, dict) for device in devices):
-                return {"recognized_text": recognized_text, "response": "No devices Found"}
-             
-            # Proceed with playing the song if the token is valid
-            device_id = devices[0].get('id')
-            if not device_id:
-                return {"recognized_text": recognized_text, "response": "No devices Found"}
-            
-            sp = spotipy.Spotify(auth=token_info['access_token'])
-            song_name = command_response["song_name"]
-            artist_name = command_response.get("artist_name")
-            logging.info(f"Searching song: {song_name}, artist: {artist_name}")
-
-            query = f"{song_name} artist:{artist_name}" if artist_name else song_name
-            search_result = sp.search(q=query, type='track', limit=1)
-
-            if search_result['tracks']['items']:
-                track = search_result['tracks']['items'][0]
-                track_uri = track['uri']
-
-                sp_devices = sp.devices()
-                if sp_devices and 'devices' in sp_devices and sp_devices['devices']:
-                    device_id = sp_devices['devices'][0]['id']
-                    logging.info(f"Playing song on device ID: {device_id}")
-                    sp.start_playback(device_id=device_id, uris=[track_uri])
-                    return {"recognized_text": recognized_text, "response": f"Playing {song_name} by {artist_name}"}
-                else:
-                    return {"recognized_text": recognized_text, "response": "No active Spotify devices found"}
-            else:
-                return {"recognized_text": recognized_text, "response": "Song not found"}
-
-        return {"recognized_text": recognized_text, "response": command_response}
+            access_token = await get_spotify_token_async()
+            if not access_token:
+                if command_response["action"] == "play":
+                    logging.error("No access token, redirecting to login.")
+                    return RedirectResponse(url="/login", status_code=302)
+                raise HTTPException(status_code=401, detail="Spotify authentication required")
+
+            job = submit_playback(command_response, run_playback_command)
+            if not wait:
+                return accepted(job, recognized_text=recognized_text, recognition=recognition,
+                                timings=timer.total())
+            with timer.stage("execute"):
+                response = await wait_for_playback(job)
+            timings = timer.total()
+            logging.info("Voice command executed", extra={"action": command_response["action"], **timings})
+            return {"recognized_text": recognized_text, "response": response,
+                    "recognition": recognition, "timings": timings}
+
+        return {"recognized_text": recognized_text, "response": command_response,
+                "recognition": recognition, "timings": timer.total()}
 
+    except HTTPException:
+        raise
+    except SpotifyException as e:
+        raise spotify_error(e)
     except Exception as e:
-        logging.error(f"Internal Server Error: {str(e)}")
+        logging.exception("Internal Server Error")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+@app.post("/voice-command/batch")
+async def process_voice_command_batch(request: Request, concurrency: int = 4):
+    """Run many voice commands in one request.
+
+    Accepts multipart form data with one audio file per command, or a JSON
+    body {"texts": [...]} of already recognized commands. Results stream back
+    as NDJSON, one line per item in completion order, tagged with "index".
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/"):
+        form = await request.form(max_files=BATCH_MAX_ITEMS)
+        items = [{"audio": value} for _, value in form.multi_items() if isinstance(value, StarletteUploadFile)]
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Expected multipart audio or a JSON body with \"texts\"")
+        texts = body.get("texts") if isinstance(body, dict) else body
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise HTTPException(status_code=400, detail="\"texts\" must be a list of strings")
+        items = [{"text": text} for text in texts]
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No commands in batch")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+    return StreamingResponse(run_batch(items, await get_spotify_token_async(), concurrency), media_type="application/x-ndjson")
+
+@app.websocket("/ws/voice-command")
+async def stream_voice_command(websocket: WebSocket):
+    """Streamed voice command.
+
+    Optionally send a JSON text message first with sample_rate, channels and
+    sample_width (default 16000/1/2), then raw PCM as binary messages, then
+    the text message "end". Partial transcripts and speculation events are
+    sent as they happen, followed by one "final" message.
+    """
+    await websocket.accept()
+    session = None
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                if session is None:
+                    session = VoiceStreamSession(await get_spotify_token_async(), notify=websocket.send_json)
+                session.feed(message["bytes"])
+                continue
+
+            text = message.get("text") or ""
+            if text.strip() == "end":
+                break
+            if session is None:
+                try:
+                    config = json.loads(text)
+                    if not isinstance(config, dict):
+                        raise ValueError("expected a JSON object")
+                    audio_format = {"sample_rate": int(config.get("sample_rate", 16000)),
+                                    "channels": int(config.get("channels", 1)),
+                                    "sample_width": int(config.get("sample_width", 2))}
+                    session = VoiceStreamSession(await get_spotify_token_async(), notify=websocket.send_json,
+                                                 **audio_format)
+                except (ValueError, TypeError) as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid stream config: {e}")
+
+        if session is None or not session.pcm:
+            await websocket.send_json({"event": "error", "detail": "No audio received"})
+        else:
+            await websocket.send_json(await session.finish())
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logging.info("Voice stream client disconnected")
+    except (RecognitionPoolFull, RecognitionTimeout, ValueError) as e:
+        await websocket.send_json({"event": "error", "detail": str(e)})
+        await websocket.close(code=1013)
+    except (HTTPException, SpotifyException) as e:
+        # Same statuses as /voice-command, as an error event
+        error = spotify_error(e) if isinstance(e, SpotifyException) else e
+        await websocket.send_json({"event": "error", "status_code": error.status_code, "detail": error.detail})
+        await websocket.close(code=1011 if error.status_code >= 500 else 1000)
+    except Exception:
+        logging.exception("Voice stream failed")
+        await websocket.close(code=1011)
+    finally:
+        if session is not None:
+            session.cancel()
+
 @app.get("/login")
 def login(request: Request):
-    oauth = create_spotify_oauth()
-    auth_url = oauth.get_authorize_url()
+    # Built once and reused; the warm-up creates it before the first login
+    auth_url = token_manager.oauth.get_authorize_url()
     return RedirectResponse(auth_url)
 
 @app.get("/callback")
@@ -109,52 +283,121 @@ async def callback(request: Request):
         raise HTTPException(status_code=400, detail="Authorization code not provided")
 
     try:
-        oauth = create_spotify_oauth()
-        token_info = oauth.get_access_token(code)
+        # check_cache=False: the token must come from this code, never from an earlier login.
+        # The exchange and the store write block, so both run off the event loop.
+        token_info = await asyncio.to_thread(token_manager.oauth.get_access_token, code, check_cache=False)
         if not token_info:
             raise HTTPException(status_code=400, detail="Failed to retrieve access token")
 
-        # Save the token for future use
-        with open(TOKEN_STORAGE_FILE, 'w') as token_file:
-            json.dump(token_info, token_file)
+        # Save the token for future use, under a new session when serving several users
+        session_id = new_session_id() if MULTI_USER else None
+        await asyncio.to_thread(token_manager.store, token_info, user_id=session_id)
         
         # Redirect back to /voice-command or wherever you want after login
-        return RedirectResponse("/spotify/devices")
+        response = RedirectResponse("/spotify/devices")
+        if session_id:
+            response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+            # For API clients that send X-Session-Id instead of cookies
+            response.headers["X-Session-Id"] = session_id
+        return response
     
     except Exception as e:
-        logging.error(f"Error during Spotify callback: {str(e)}")
+        logging.error("Error during Spotify callback", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Error in Spotify callback: {str(e)}")
 
 
+@app.get("/recognition/metrics")
+async def recognition_metrics():
+    return {**recognition_pool.stats(), "cache": recognition_cache.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+if DEBUG_ENDPOINTS:
+    @app.post("/debug/profiler/start")
+    async def start_profiler(interval_ms: float = None):
+        if not profiler.start(interval_ms):
+            raise HTTPException(status_code=409, detail="Profiler is already running")
+        return profiler.stats()
+
+    @app.post("/debug/profiler/stop")
+    async def stop_profiler():
+        profiler.stop()
+        return profiler.stats()
+
+    @app.get("/debug/profiler")
+    async def profiler_report(limit: int = None):
+        # Collapsed stacks, ready for flamegraph.pl or speedscope
+        return PlainTextResponse(profiler.collapsed(limit))
+
+@app.get("/spotify/metrics")
+async def spotify_metrics():
+    # Limiter, 429 and request coalescing counters of the Spotify gateway
+    return spotify_client.stats()
+
 @app.get("/spotify/devices")
-def get_devices( access_token: str):
-    return get_spotify_devices(access_token)
+async def get_devices( access_token: str):
+    return await get_spotify_devices(access_token)
 
 @app.get("/spotify-search")
-async def search_spotify_track(query: str):
+async def search_spotify_track(request: Request, query: str, fields: str = None):
+    """Search for a track.
+
+    By default each track is reduced to uri, name and artist; fields= picks
+    other fields (comma separated) and fields=raw returns Spotify's payload.
+    Responses carry an ETag, and a matching If-None-Match gets a 304.
+    """
+    projection = parse_fields(fields)
     try:
-        token_info = get_spotify_token()
-        if not token_info:
+        access_token = await get_spotify_token_async()
+        if not access_token:
             logging.warning("No valid token found, redirecting to login.")
             return RedirectResponse(url="/login")
 
-        sp = Spotify(auth=token_info)
-        search_results = sp.search(q=query, type='track', limit=1)
-        logging.info(f"Search results: {search_results}")
-        return search_results
+        sp = spotify_client.for_token(access_token)
+        search_results = await search_track(sp, query, use_index=False)
+        found = bool((search_results or {}).get("tracks", {}).get("items"))
+        logging.info("Spotify search", extra={"query": query, "found": found})
+        log_payload(logging.getLogger(), "Spotify search results", search_results, query=query)
+
+        body = dumps(project(search_results, projection))
+        etag = make_etag(make_key(query), projection, body)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
     
+    except SpotifyException as e:
+        raise spotify_error(e)
     except Exception as e:
-        logging.error(f"Spotify search failed: {str(e)}")
+        logging.error("Spotify search failed", extra={"query": query, "error": str(e)})
         raise HTTPException(status_code=500, detail=f"Spotify search failed: {str(e)}")
 @app.post("/play_song")
-async def play_song(access_token: str, song_uri: str):
-    devices = get_spotify_devices(access_token)
-    if devices:
-        device_id = devices[0].get('id')  # Select the first device
-        response = play_song_on_spotify(access_token, device_id, song_uri)
-        return {"message": "Song played successfully"}
-    else:
-        raise HTTPException(status_code=404, detail="No devices found")
+async def play_song(access_token: str, song_uri: str, wait: bool = False):
+    async def run(command):
+        device_id = await play_uri(access_token, command["song_uri"])
+        if not device_id:
+            raise HTTPException(status_code=404, detail="No devices found")
+        return "Song played successfully"
+
+    # The caller's own token, which TokenManager never refreshes, picks the account
+    job = submit_playback({"action": "play_uri", "song_uri": song_uri}, run, queue_key=f"token:{access_token}")
+    if not wait:
+        return accepted(job)
+    return {"message": await wait_for_playback(job)}
+
+@app.get("/playback/jobs/{job_id}")
+async def playback_job(job_id: str):
+    job = playback_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+@app.get("/playback/metrics")
+async def playback_metrics():
+    return playback_queue.stats()
 
 if __name__ == "__main__":
     import uvicorn
@@ -165,7 +408,9 @@ if __name__ == "__main__":
 async def sucess_page():
     return{"message": "Login successful, you can now use voice commands!"}
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
     return {"status": "healthy"}
 
 
@@ -0,0 +1,183 @@
+# audio_ingest.py
+import os
+import struct
+import logging
+from tempfile import SpooledTemporaryFile
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+AUDIO_CHUNK_SIZE = 64 * 1024
+# Enough to reach the fmt/COMM/STREAMINFO block in any sane file
+AUDIO_HEADER_BYTES = 4096
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", str(20 * 1024 * 1024)))
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "30"))
+# Uploads larger than this spill from memory to a temp file
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Highest byte rate an accepted upload is expected to have (48 kHz stereo
+# 32-bit, or 96 kHz stereo 16-bit); bounds the body size before it is read
+MAX_AUDIO_BYTE_RATE = int(os.getenv("MAX_AUDIO_BYTE_RATE", str(48000 * 2 * 4)))
+# Room for multipart boundaries and part headers around the audio
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _parse_wav(head):
+    info = {"format": "wav"}
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", head, offset)
+        body = offset + 8
+        if chunk_id == b"fmt " and body + 16 <= len(head):
+            _, channels, sample_rate, byte_rate, _, bits = struct.unpack_from("<HHIIHH", head, body)
+            info.update(channels=channels, sample_rate=sample_rate, sample_width=bits // 8, byte_rate=byte_rate)
+        elif chunk_id == b"data":
+            info["data_bytes"] = chunk_size
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    if "sample_rate" not in info:
+        raise HTTPException(status_code=400, detail="Malformed WAV header")
+    if "data_bytes" in info and info["byte_rate"]:
+        info["duration"] = info["data_bytes"] / info["byte_rate"]
+    return info
+
+
+def _parse_extended(raw):
+    # 80-bit IEEE 754 extended float, used for the AIFF sample rate
+    exponent, mantissa = struct.unpack(">HQ", raw)
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63)
+
+
+def _parse_aiff(head):
+    info = {"format": "aiff"}
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from(">4sI", head, offset)
+        body = offset + 8
+        if chunk_id == b"COMM" and body + 18 <= len(head):
+            channels, frames, bits = struct.unpack_from(">HIH", head, body)
+            sample_rate = _parse_extended(head[body + 8:body + 18])
+            info.update(channels=channels, sample_rate=sample_rate, sample_width=bits // 8)
+            if sample_rate:
+                info["duration"] = frames / sample_rate
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    if "sample_rate" not in info:
+        raise HTTPException(status_code=400, detail="Malformed AIFF header")
+    return info
+
+
+def _parse_flac(head):
+    # STREAMINFO is always the first metadata block
+    if len(head) < 8 + 18 or head[4] & 0x7F != 0:
+        raise HTTPException(status_code=400, detail="Malformed FLAC header")
+    packed = int.from_bytes(head[18:26], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    info = {"format": "flac", "channels": channels, "sample_rate": sample_rate, "sample_width": (bits + 7) // 8}
+    if sample_rate and total_samples:
+        info["duration"] = total_samples / sample_rate
+    return info
+
+
+def parse_audio_header(head):
+    """Return format, channels, sample_rate, sample_width and (when known) duration."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _parse_wav(head)
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return _parse_aiff(head)
+    if head[:4] == b"fLaC":
+        return _parse_flac(head)
+    raise HTTPException(status_code=415, detail="Unsupported audio format, expected WAV, AIFF or FLAC")
+
+
+def check_audio_limits(info, size=None, max_bytes=MAX_AUDIO_BYTES, max_seconds=MAX_AUDIO_SECONDS):
+    if size is not None and size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {max_bytes} bytes")
+    if info.get("duration") and info["duration"] > max_seconds:
+        raise HTTPException(status_code=413, detail=f"Audio exceeds {max_seconds:g} seconds")
+
+
+async def read_audio_upload(upload, max_bytes=MAX_AUDIO_BYTES, max_seconds=MAX_AUDIO_SECONDS):
+    """Validate an UploadFile and return (file object, header info) without buffering it.
+
+    UploadLimitMiddleware has already bounded the request body; here the
+    header is checked before the audio is used, so long or malformed audio
+    is rejected before recognition. The returned file is positioned at the
+    start and can be handed straight to the recognizer.
+    """
+    head = await upload.read(AUDIO_HEADER_BYTES)
+    info = parse_audio_header(head)
+    check_audio_limits(info, getattr(upload, "size", None), max_bytes, max_seconds)
+
+    source = upload.file
+    if source.seekable():
+        # Starlette already spooled the upload; use it in place rather than copying
+        source.seek(0, os.SEEK_END)
+        check_audio_limits(info, source.tell(), max_bytes, max_seconds)
+        source.seek(0)
+        return source, info
+
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    spool.write(head)
+    total = len(head)
+    while True:
+        chunk = await upload.read(AUDIO_CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            spool.close()
+            check_audio_limits(info, total, max_bytes, max_seconds)
+        spool.write(chunk)
+    spool.seek(0)
+    logging.info("Spooled audio upload", extra={"bytes": total, "format": info["format"]})
+    return spool, info
+
+
+def max_upload_bytes(files=1, max_bytes=MAX_AUDIO_BYTES, max_seconds=MAX_AUDIO_SECONDS,
+                     byte_rate=MAX_AUDIO_BYTE_RATE):
+    """Largest request body that can hold `files` acceptable audio uploads."""
+    return files * (min(max_bytes, int(max_seconds * byte_rate)) + MULTIPART_OVERHEAD)
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware rejecting oversized audio uploads before the body is read.
+
+    `limits` maps a path to its body limit in bytes. A Content-Length over
+    the limit gets a 413 straight away; a chunked body is counted as it
+    arrives and fails with 413 once it passes the limit, instead of being
+    spooled in full by the multipart parser first.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Upload exceeds {limit} bytes"
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                logging.warning("Rejected oversized upload", extra={"path": scope["path"], "bytes": int(value)})
+                await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -0,0 +1,115 @@
+# audio_preprocess.py
+import os
+import time
+import wave
+import logging
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+VAD_FRAME_MS = 20
+# A frame counts as voice if it is within this many dB of the loudest frame...
+VAD_RANGE_DB = float(os.getenv("VAD_RANGE_DB", "35"))
+# ...and above this absolute floor (in dBFS), so pure silence is never "voice"
+VAD_FLOOR_DBFS = float(os.getenv("VAD_FLOOR_DBFS", "-55"))
+# Keep a little audio around the detected voice so word edges aren't clipped
+VAD_PADDING_MS = 200
+
+_DTYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+
+def decode_wav(audio_file):
+    """Decode a PCM WAV into float32 samples in [-1, 1] with shape (frames, channels)."""
+    with wave.open(audio_file, "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        width = wav_file.getsampwidth()
+        rate = wav_file.getframerate()
+        raw = wav_file.readframes(wav_file.getnframes())
+
+    if width == 3:
+        # 24-bit: widen to int32 by placing the three bytes in the top of each word
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = np.zeros((packed.shape[0], 4), dtype=np.uint8)
+        samples[:, 1:] = packed
+        samples = samples.view("<i4").ravel().astype(np.float32) / 2 ** 31
+    elif width in _DTYPES:
+        samples = np.frombuffer(raw, dtype=_DTYPES[width]).astype(np.float32)
+        if width == 1:
+            samples = (samples - 128) / 128
+        else:
+            samples /= 2 ** (8 * width - 1)
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def downmix(samples):
+    return samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+
+
+def resample(samples, source_rate, target_rate=TARGET_SAMPLE_RATE):
+    if source_rate == target_rate or samples.size == 0:
+        return samples
+    if source_rate > target_rate:
+        # Box filter over the decimation ratio as a cheap anti-aliasing low-pass
+        width = int(round(source_rate / target_rate))
+        if width > 1:
+            samples = np.convolve(samples, np.full(width, 1.0 / width, dtype=np.float32), mode="same")
+    duration = samples.size / source_rate
+    target_times = np.arange(int(duration * target_rate), dtype=np.float64) / target_rate
+    source_times = np.arange(samples.size, dtype=np.float64) / source_rate
+    return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def trim_silence(samples, rate=TARGET_SAMPLE_RATE):
+    """Drop leading and trailing silence using per-frame RMS energy."""
+    frame = int(rate * VAD_FRAME_MS / 1000)
+    frames = samples.size // frame
+    if frames == 0:
+        return samples
+    energy = np.sqrt(np.mean(samples[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(energy, 1e-10))
+    voiced = np.flatnonzero((db > db.max() - VAD_RANGE_DB) & (db > VAD_FLOOR_DBFS))
+    if voiced.size == 0:
+        return samples[:0]
+    padding = int(VAD_PADDING_MS / VAD_FRAME_MS)
+    start = max(0, voiced[0] - padding) * frame
+    end = min(frames, voiced[-1] + 1 + padding) * frame
+    return samples[start:end]
+
+
+def to_pcm16(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def preprocess_audio(audio_file, max_seconds=None):
+    """Decode once, downmix, resample to 16 kHz and trim silence.
+
+    Returns (pcm16 bytes at TARGET_SAMPLE_RATE, stats), or None if the audio
+    isn't a PCM WAV we can decode, in which case the caller should fall back
+    to handing the original file to the recognizer.
+    """
+    start = time.perf_counter()
+    position = audio_file.tell()
+    try:
+        samples, rate = decode_wav(audio_file)
+    except (wave.Error, ValueError, EOFError) as e:
+        logging.info("Skipping audio preprocessing", extra={"reason": str(e)})
+        audio_file.seek(position)
+        return None
+
+    bytes_in = audio_file.tell() - position
+    mono = resample(downmix(samples), rate)
+    trimmed = trim_silence(mono)
+    if max_seconds:
+        trimmed = trimmed[:int(max_seconds * TARGET_SAMPLE_RATE)]
+    pcm = to_pcm16(trimmed)
+
+    stats = {
+        "bytes_in": bytes_in,
+        "bytes_out": len(pcm),
+        "seconds_in": round(samples.shape[0] / rate, 3),
+        "seconds_out": round(trimmed.size / TARGET_SAMPLE_RATE, 3),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    return pcm, stats
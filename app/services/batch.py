@@ -0,0 +1,86 @@
+# batch.py
+import os
+import json
+import asyncio
+import logging
+from fastapi import HTTPException
+from app.services.audio_ingest import read_audio_upload, MAX_AUDIO_SECONDS
+from app.services.command_parser import parse_command, execute_command, COMMAND_HANDLERS
+from app.services.play_pipeline import prepare_track, play_prepared, describe_play_result
+from app.services.recognition_pool import recognition_pool, RecognitionPoolFull, RecognitionTimeout
+from app.services.search_cache import make_key
+from app.services.singleflight import SingleFlight
+from app.services.spotify_client import spotify_client
+from app.services.timing import StageTimer
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "64"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+
+async def _run_item(index, item, sp, lookups, timer):
+    recognition = None
+    if "audio" in item:
+        with timer.stage("upload"):
+            audio_file, _ = await read_audio_upload(item["audio"])
+        with timer.stage("recognition"):
+            recognition = await recognition_pool.submit(audio_file, max_seconds=MAX_AUDIO_SECONDS)
+        recognized_text = recognition.pop("text")
+    else:
+        recognized_text = item["text"]
+
+    with timer.stage("parse"):
+        command = parse_command(recognized_text)
+
+    if command.get("action") == "play":
+        if sp is None:
+            response = "Spotify authentication required"
+        else:
+            song_name, artist_name = command["song_name"], command.get("artist_name")
+            # Items asking for the same song share one search and device lookup
+            with timer.stage("lookup"):
+                track, device_id = await lookups.do(
+                    make_key(song_name, artist_name),
+                    lambda: prepare_track(sp, song_name, artist_name, StageTimer(), command.get("alternatives")),
+                )
+            response = describe_play_result(await play_prepared(sp, track, device_id, timer))
+    elif command.get("action") in COMMAND_HANDLERS:
+        with timer.stage("execute"):
+            response = await execute_command(command)
+    else:
+        response = command
+
+    result = {"index": index, "recognized_text": recognized_text, "response": response}
+    if recognition is not None:
+        result["recognition"] = recognition
+    result["timings"] = timer.total()
+    return result
+
+
+async def run_batch(items, access_token, concurrency):
+    """Run batch items concurrently and yield one NDJSON line per item as it completes."""
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    lookups = SingleFlight()
+    sp = spotify_client.for_token(access_token) if access_token else None
+
+    async def run(index, item):
+        async with semaphore:
+            try:
+                return await _run_item(index, item, sp, lookups, StageTimer())
+            except HTTPException as e:
+                return {"index": index, "error": e.detail, "status_code": e.status_code}
+            except RecognitionPoolFull as e:
+                return {"index": index, "error": str(e), "status_code": 503, "retry_after": e.retry_after}
+            except RecognitionTimeout as e:
+                return {"index": index, "error": str(e), "status_code": 504}
+            except Exception as e:
+                logging.error("Batch item failed", extra={"index": index, "error": str(e)})
+                return {"index": index, "error": str(e), "status_code": 500}
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+        logging.info("Batch done", extra={"items": len(items), **lookups.stats()})
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,84 +1,82 @@
 import re
-import requests
-from spotipy import Spotify
-from app.services.spotify_auth import get_spotify_token
-from app.services.spotify_service import play_song_on_spotify,get_spotify_devices
-import os
-import logging
-import json
-from requests import get
-from fastapi import HTTPException 
+from app.services import music_streaming
+
+# Intent grammar: (action, pattern, builder). Patterns are matched against the
+# whole lower-cased utterance; named groups inside a pattern must be prefixed
+# with the action so they stay unique once everything is combined. Order
+# matters: earlier intents win, so bare "play" resumes before "play <song>".
+_VOLUME_STEP = 10
+
+
+def _split_artist(query):
+    # Split on the last standalone "by" so "stand by me by ben e king" keeps
+    # the title intact and words like "baby" are never split
+    match = _BY.match(query)
+    if not match:
+        return {"song_name": query, "artist_name": None}
+    song_name, artist_name = match.group(1), match.group(2)
+    # "play stand by me" is ambiguous; the whole phrase is kept as a fallback title
+    return {"song_name": song_name, "artist_name": artist_name,
+            "alternatives": [{"song_name": query, "artist_name": None}]}
+
+
+COMMAND_GRAMMAR = [
+    ("pause", r"(?:pause|stop)(?: (?:the )?(?:music|song|playback|track))?", None),
+    ("resume", r"(?:resume|continue|unpause|play)(?: (?:the )?(?:music|song|playback))?", None),
+    ("skip", r"(?:skip|next)(?: (?:this |the )?(?:song|track))?|play (?:the )?next (?:song|track)", None),
+    ("previous", r"(?:previous|go back|back)(?: (?:song|track))?|play (?:the )?previous (?:song|track)", None),
+    ("volume",
+     r"(?:set |change )?(?:the )?volume (?:to )?(?P<volume_level>\d{1,3})(?: ?%| percent)?",
+     lambda m: {"volume_level": min(100, int(m.group("volume_level")))}),
+    ("volume_up", r"(?:turn (?:it |the volume |the music )?up|volume up|louder)",
+     lambda m: {"step": _VOLUME_STEP}),
+    ("volume_down", r"(?:turn (?:it |the volume |the music )?down|volume down|quieter|softer)",
+     lambda m: {"step": -_VOLUME_STEP}),
+    ("queue", r"(?:queue|add) (?P<queue_query>.+?)(?: to (?:the |my )?queue)?",
+     lambda m: _split_artist(m.group("queue_query"))),
+    ("play", r"play (?P<play_query>.+)", lambda m: _split_artist(m.group("play_query"))),
+]
+
+_BY = re.compile(r"^(.*\S)\s+by\s+(\S.*)$")
+_SPACES = re.compile(r"\s+")
+# Compiled once: one alternation with a named group per intent, so the
+# matched intent is simply m.lastgroup
+_COMMAND_RE = re.compile(
+    "|".join(f"(?P<{action}>{pattern})" for action, pattern, _ in COMMAND_GRAMMAR)
+)
+_BUILDERS = {action: builder for action, _, builder in COMMAND_GRAMMAR}
+
 
 def parse_command(text: str):
-    text = text.lower()
-    
-    if text.startswith("play"):
-        # Extract the song title and artist
-        try:
-            parts = text.split("by")
-            song_name = parts[0].replace("play", "").strip()
-            artist_name = parts[1].strip() if len(parts) > 1 else None
-            return {"action": "play", "song_name": song_name, "artist_name": artist_name}
-        except Exception as e:
-            return {"error": f"Could not parse song name and artist: {str(e)}"}
-    else:
-        return {"error": "Command not recognized"}
+    text = _SPACES.sub(" ", text.lower()).strip(" .,!?")
 
-def get_spotify_devices(access_token: str):
-    url = "https://api.spotify.com/v1/me/player/devices"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    match = _COMMAND_RE.fullmatch(text)
+    if not match:
+        return {"error": "Command not recognized"}
 
-    response = requests.get(url, headers=headers)
+    action = match.lastgroup
+    builder = _BUILDERS[action]
+    command = {"action": action}
+    if builder is not None:
+        command.update(builder(match))
+    return command
 
-    if response.status_code == 200:
-        response_json = response.json()
-        if isinstance(response_json, dict):
-            return response_json
-        else:
-            raise HTTPException(status_code=500, detail="Invalid response from Spotify API")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    
-    response = requests.get(url, headers=headers)
-    print(response.text)  #
 
-def get_track_uri(access_token, track_name, artist_name):
-    url = "https://api.spotify.com/v1/search/tracks"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"q": f"track:{track_name} artist:{artist_name}"}
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        response_json = response.json()
-        if 'tracks' in response_json and 'items' in response_json['tracks']:
-            if response_json['tracks']['items']:
-                track_uri = response_json['tracks']['items'][0]['uri']
-                return track_uri
-            else:
-                raise HTTPException(status_code=404, detail="Track not found")
-        else:
-            raise HTTPException(status_code=404, detail="Track not found")
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
+# action -> (handler, argument names taken from the parsed command)
+COMMAND_HANDLERS = {
+    "play": (music_streaming.play_song, ("song_name", "artist_name", "alternatives")),
+    "pause": (music_streaming.pause_song, ()),
+    "resume": (music_streaming.resume_song, ()),
+    "skip": (music_streaming.skip_song, ()),
+    "previous": (music_streaming.previous_song, ()),
+    "volume": (music_streaming.adjust_volume, ("volume_level",)),
+    "volume_up": (music_streaming.step_volume, ("step",)),
+    "volume_down": (music_streaming.step_volume, ("step",)),
+    "queue": (music_streaming.queue_song, ("song_name", "artist_name", "alternatives")),
+}
 
 
-def handle_voice_command():
-    if os.path.exists('token.json'):
-        logging.info("Token file found, attempting to retrieve token")
-        with open('token.json') as f:
-            token_info = json.load(f)
-            logging.info(f"Token info: {token_info}")
-            if isinstance(token_info, dict):
-                access_token = token_info.get('access_token')
-                if access_token:
-                    device_id = get_spotify_devices  # retrieve device_id from somewhere
-                    track_uri = get_track_uri  # retrieve track_uri from somewhere
-                    play_song_on_spotify(access_token, device_id, track_uri)
-                else:
-                    logging.error("Access token not found in token info")
-            else:
-                logging.error("Token info is not a dictionary")
-    else:
-        logging.error("Token file not found")
-        # handle error case
+async def execute_command(command):
+    """Run a parsed command against music_streaming and return its message."""
+    handler, arg_names = COMMAND_HANDLERS[command["action"]]
+    return await handler(*(command.get(name) for name in arg_names))
@@ -0,0 +1,97 @@
+# device_cache.py
+import os
+import time
+from collections import OrderedDict
+from app.services.metrics import register_cache
+
+DEVICE_CACHE_TTL = float(os.getenv("DEVICE_CACHE_TTL", "30"))
+# Users kept in memory; the least recently used are dropped beyond this
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", "10000"))
+
+
+class DeviceCache:
+    """Per-user cache of the Spotify device list and the last device played on.
+
+    The device list expires after a short TTL. The last used device is kept
+    until playback on it fails, so repeated commands can skip the device
+    lookup entirely. Entries are keyed by user rather than access token so
+    they survive token refreshes, and at most `maxsize` users are kept.
+    """
+
+    def __init__(self, ttl=DEVICE_CACHE_TTL, maxsize=DEVICE_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # user -> [device list expiry, device list or None, last device id or None]
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, user_key):
+        entry = self._entries.get(user_key)
+        if entry is not None:
+            self._entries.move_to_end(user_key)
+            if entry[1] is not None and entry[0] < time.monotonic():
+                entry[1] = None
+                if entry[2] is None:
+                    del self._entries[user_key]
+        return entry
+
+    def _entry_for_write(self, user_key):
+        entry = self._entry(user_key)
+        if entry is None or user_key not in self._entries:
+            entry = self._entries[user_key] = [0.0, None, None]
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, user_key):
+        entry = self._entry(user_key)
+        return self._count(entry[1] if entry else None)
+
+    def set(self, user_key, devices):
+        entry = self._entry_for_write(user_key)
+        entry[0], entry[1] = time.monotonic() + self.ttl, devices
+
+    def last_device(self, user_key):
+        entry = self._entry(user_key)
+        return self._count(entry[2] if entry else None)
+
+    def remember_device(self, user_key, device_id):
+        self._entry_for_write(user_key)[2] = device_id
+
+    def invalidate(self, user_key):
+        self._entries.pop(user_key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def pick_device(devices):
+    if not devices:
+        return None
+    active = [device for device in devices if device.get('is_active')]
+    return (active or devices)[0].get('id')
+
+
+device_cache = DeviceCache()
+register_cache("device", device_cache.stats)
@@ -0,0 +1,152 @@
+# logging_setup.py
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from app.services.metrics import registry
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for key=value lines, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Payload fields longer than this are cut when the record is written
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "512"))
+# Share of full payloads (search results, response bodies) that are logged at all
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+
+REDACTED = "[REDACTED]"
+_SECRET_PATTERNS = (
+    re.compile(r"(Bearer\s+)[A-Za-z0-9._~+/=-]+", re.IGNORECASE),
+    re.compile(r"""(\b(?:access_token|refresh_token|client_secret|authorization|code)['"]?\s*[:=]\s*['"]?)"""
+               r"""(?!Bearer\s)[^'"\s,&}]+""", re.IGNORECASE),
+)
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def redact(text):
+    for pattern in _SECRET_PATTERNS:
+        text = pattern.sub(lambda match: match.group(1) + REDACTED, text)
+    return text
+
+
+def truncate(value, limit=LOG_PAYLOAD_MAX_CHARS):
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[{len(text) - limit} more chars]"
+
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Message plus `extra` fields, with long values cut and secrets redacted.
+
+    Runs on the listener thread, so rendering payloads costs the request
+    nothing beyond handing the record to the queue.
+    """
+
+    def __init__(self, style=LOG_FORMAT, max_chars=LOG_PAYLOAD_MAX_CHARS):
+        super().__init__()
+        self.json = style == "json"
+        self.max_chars = max_chars
+
+    def format(self, record):
+        fields = {key: truncate(value, self.max_chars) if not isinstance(value, (int, float, bool)) else value
+                  for key, value in record_fields(record).items()}
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        message = record.getMessage()
+        if self.json:
+            line = json.dumps({"ts": f"{timestamp}.{int(record.msecs):03d}", "level": record.levelname,
+                               "logger": record.name, "msg": message, **fields}, default=str)
+        else:
+            pairs = " ".join(f"{key}={json.dumps(value) if isinstance(value, str) else value}"
+                             for key, value in fields.items())
+            line = f"{timestamp}.{int(record.msecs):03d} {record.levelname} {record.name}: {message}"
+            line = f"{line} {pairs}" if pairs else line
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return redact(line)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread; drops them instead of blocking when it falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the args now so the listener never sees objects mutated after the call
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(level=LOG_LEVEL, stream=None, style=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE):
+    """Route all logging through a bounded queue to one background writer thread."""
+    global _listener, _queue_handler
+    stop_logging()
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(StructuredFormatter(style))
+    _queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    # httpx logs every Spotify call at INFO; the metrics already count those
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # uvicorn's own loggers write synchronously; send them through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, writer, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush what is queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def log_payload(logger, message, payload, sample_rate=LOG_PAYLOAD_SAMPLE_RATE, **fields):
+    """Log a large payload at DEBUG for a sampled share of calls only."""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < sample_rate:
+        logger.debug(message, extra={**fields, "payload": payload})
+
+
+def _collect_logging():
+    return [("log_records_dropped_total", "counter", "Log records dropped because the log queue was full",
+             [({}, dropped_records())])]
+
+
+registry.register_collector(_collect_logging)
+atexit.register(stop_logging)
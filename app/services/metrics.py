@@ -0,0 +1,217 @@
+# metrics.py
+import os
+import time
+import bisect
+import threading
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Seconds; covers cache hits (sub-ms) up to slow recognition
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry, name, description, labels=()):
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        registry.register(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        # Plain dict update; a lost increment under a thread race is acceptable here
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        series = self._values.get(key)
+        if series is None:
+            # Per-bucket (non-cumulative) counts, then sum and count
+            series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, series in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _format_labels(self.label_names + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format.
+
+    Collectors are callables run at scrape time that return
+    (name, kind, description, [(labels dict, value), ...]) tuples, for state
+    that already lives elsewhere, like cache and pool counters.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def counter(self, name, description, labels=()):
+        return Counter(self, name, description, labels)
+
+    def gauge(self, name, description, labels=()):
+        return Gauge(self, name, description, labels)
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, description, labels, buckets)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, description, samples in collector():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+REQUESTS_TOTAL = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+STAGE_SECONDS = registry.histogram(
+    "pipeline_stage_duration_seconds", "Voice command pipeline latency by stage", ("stage",))
+SPOTIFY_REQUESTS_TOTAL = registry.counter(
+    "spotify_requests_total", "Spotify Web API calls by endpoint and status", ("method", "endpoint", "status"))
+SPOTIFY_REQUEST_SECONDS = registry.histogram(
+    "spotify_request_duration_seconds", "Spotify Web API latency by endpoint", ("method", "endpoint"))
+SPOTIFY_IN_FLIGHT = registry.gauge("spotify_requests_in_flight", "Spotify Web API calls currently in flight")
+
+_caches = {}
+
+
+def register_cache(name, stats):
+    """Expose a cache's hits, misses and hit ratio; `stats()` returns a dict with those keys."""
+    _caches[name] = stats
+
+
+def _collect_caches():
+    snapshots = [(name, stats()) for name, stats in _caches.items()]
+    return [
+        ("cache_hits_total", "counter", "Cache hits by cache",
+         [({"cache": name}, snapshot["hits"]) for name, snapshot in snapshots]),
+        ("cache_misses_total", "counter", "Cache misses by cache",
+         [({"cache": name}, snapshot["misses"]) for name, snapshot in snapshots]),
+        ("cache_hit_ratio", "gauge", "Cache hit ratio since start by cache",
+         [({"cache": name}, round(snapshot["hit_ratio"], 4)) for name, snapshot in snapshots]),
+    ]
+
+
+registry.register_collector(_collect_caches)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight count per route.
+
+    The route label is the matched path template (e.g. "/spotify-search"),
+    never the raw URL, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, registry=registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route)
+            REQUESTS_TOTAL.inc(method=method, route=route, status=status)
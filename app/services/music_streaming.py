@@ -1,58 +1,97 @@
 # music_streaming.py
-import spotipy
 from fastapi import HTTPException
-from .spotify_auth import get_spotify_token
+from .spotify_auth import get_spotify_token_async
+from .spotify_client import spotify_client, SpotifyException
+from .play_pipeline import play_track, resolve_track
 
-def get_spotify_client():
-    token_info = get_spotify_token()
-    if isinstance(token_info, dict) and 'access_token' in token_info:
-        return spotipy.Spotify(auth=token_info['access_token'])
+async def get_spotify_client():
+    access_token = await get_spotify_token_async()
+    if access_token:
+        return spotify_client.for_token(access_token)
     else:
         raise HTTPException(status_code=401, detail="Spotify authentication required")
 
 # music_streaming.py
 
-def play_song(song_name, artist=None):
-    try:
-        sp = get_spotify_client()
-        query = f"track:{song_name}"
-        if artist:
-            query += f" artist:{artist}"
-        
-        results = sp.search(q=query, limit=1, type='track')
-        if results['tracks']['items']:
-            track_uri = results['tracks']['items'][0]['uri']
-            track_name = results['tracks']['items'][0]['name']
-            artist_name = results['tracks']['items'][0]['artists'][0]['name']
-            
-            # Check if there's an active device
-            devices = sp.devices()
-            if not devices['devices']:
-                return "No active Spotify devices found. Please open Spotify on a device."
-            
-            # Use the first available device
-            device_id = devices['devices'][0]['id']
-            
-            sp.start_playback(device_id=device_id, uris=[track_uri])
-            return f"Playing '{track_name}' by {artist_name}"
+async def play_song(song_name, artist=None, alternatives=None):
+    try:
+        access_token = await get_spotify_token_async()
+        if not access_token:
+            raise HTTPException(status_code=401, detail="Spotify authentication required")
+
+        result = await play_track(access_token, song_name, artist, alternatives=alternatives)
+        if result["status"] == "no_devices":
+            return "No active Spotify devices found. Please open Spotify on a device."
+        if result["status"] == "playing":
+            track = result["track"]
+            return f"Playing '{track['name']}' by {track['artists'][0]['name']}"
         return f"Song '{song_name}' not found"
-    except spotipy.SpotifyException as e:
+    except SpotifyException as e:
         if e.http_status == 404 and "NO_ACTIVE_DEVICE" in str(e):
             return "No active Spotify devices found. Please open Spotify on a device."
         raise HTTPException(status_code=e.http_status, detail=str(e))
 
-def pause_song():
+async def pause_song():
     try:
-        sp = get_spotify_client()
-        sp.pause_playback()
+        sp = await get_spotify_client()
+        await sp.pause_playback()
         return "Playback paused"
-    except spotipy.SpotifyException as e:
+    except SpotifyException as e:
         raise HTTPException(status_code=e.http_status, detail=str(e))
 
-def adjust_volume(volume_level):
+async def adjust_volume(volume_level):
     try:
-        sp = get_spotify_client()
-        sp.volume(volume_level)
+        sp = await get_spotify_client()
+        await sp.volume(volume_level)
         return f"Volume set to {volume_level}%"
-    except spotipy.SpotifyException as e:
-        raise HTTPException(status_code=e.http_status, detail=str(e))
\ No newline at end of file
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
+
+async def step_volume(step):
+    try:
+        sp = await get_spotify_client()
+        playback = await sp.current_playback()
+        if not playback or not playback.get('device'):
+            return "No active Spotify devices found. Please open Spotify on a device."
+        current = playback['device'].get('volume_percent') or 0
+        volume_level = max(0, min(100, current + step))
+        await sp.volume(volume_level)
+        return f"Volume set to {volume_level}%"
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
+
+async def resume_song():
+    try:
+        sp = await get_spotify_client()
+        await sp.start_playback()
+        return "Playback resumed"
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
+
+async def skip_song():
+    try:
+        sp = await get_spotify_client()
+        await sp.next_track()
+        return "Skipped to next track"
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
+
+async def previous_song():
+    try:
+        sp = await get_spotify_client()
+        await sp.previous_track()
+        return "Back to previous track"
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
+
+async def queue_song(song_name, artist=None, alternatives=None):
+    try:
+        sp = await get_spotify_client()
+        # "queue stand by me" is read the same ways as "play stand by me"
+        track = await resolve_track(sp, [{"song_name": song_name, "artist_name": artist}, *(alternatives or ())])
+        if track is None:
+            return f"Song '{song_name}' not found"
+        await sp.add_to_queue(track['uri'])
+        return f"Queued '{track['name']}' by {track['artists'][0]['name']}"
+    except SpotifyException as e:
+        raise HTTPException(status_code=e.http_status, detail=str(e))
@@ -0,0 +1,161 @@
+# play_pipeline.py
+import asyncio
+import logging
+from app.services.spotify_client import spotify_client, SpotifyException
+from app.services.search_cache import search_track, normalize
+from app.services.device_cache import device_cache, pick_device
+from app.services.timing import StageTimer
+from app.services.user_session import current_user
+
+
+def is_no_active_device(error):
+    return error.http_status == 404 and ("NO_ACTIVE_DEVICE" in str(error) or "Device not found" in str(error))
+
+
+async def get_devices(sp, refresh=False):
+    """Return the user's device list, from the short-TTL cache unless refresh is set."""
+    devices = None if refresh else device_cache.get(current_user.get())
+    if devices is None:
+        response = await sp.devices()
+        devices = response.get('devices', []) if isinstance(response, dict) else []
+        # An empty list isn't cached: the user may open Spotify right after
+        # hearing there is no device, and the next command has to see it
+        if devices:
+            device_cache.set(current_user.get(), devices)
+    return devices
+
+
+async def resolve_device(sp, timer, refresh=False):
+    if not refresh:
+        device_id = device_cache.last_device(current_user.get())
+        if device_id:
+            return device_id
+    devices = await timer.timed("devices", get_devices(sp, refresh=refresh))
+    return pick_device(devices)
+
+
+async def start_on_device(sp, device_id, uris, timer):
+    """Start playback, retrying once on a fresh device list if the device went away.
+
+    Returns the device the track is playing on, or None if there is none.
+    """
+    try:
+        with timer.stage("start_playback"):
+            await sp.start_playback(device_id=device_id, uris=uris)
+    except SpotifyException as e:
+        if not is_no_active_device(e):
+            raise
+        logging.info("Device is no longer available, refreshing device list", extra={"device_id": device_id})
+        device_cache.invalidate(current_user.get())
+        device_id = await resolve_device(sp, timer, refresh=True)
+        if not device_id:
+            return None
+        with timer.stage("start_playback_retry"):
+            await sp.start_playback(device_id=device_id, uris=uris)
+
+    device_cache.remember_device(current_user.get(), device_id)
+    return device_id
+
+
+def _dice(a, b):
+    a, b = set(normalize(a).split()), set(normalize(b).split())
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def match_score(track, song_name, artist_name=None):
+    """How well a search result fits one reading of the command, 0..1.
+
+    The title counts most; a named artist that doesn't match halves the
+    score rather than zeroing it, as recognition often misspells artists.
+    """
+    score = _dice(song_name, track.get("name", ""))
+    if artist_name:
+        artist_score = max((_dice(artist_name, artist.get("name", "")) for artist in track.get("artists") or ()),
+                           default=0.0)
+        score *= 0.5 + 0.5 * artist_score
+    return score
+
+
+async def resolve_track(sp, readings, timer=None):
+    """The search result that best matches one of the readings, or None.
+
+    `readings` ({"song_name", "artist_name"}) are the ways a command can be
+    read, e.g. "stand by me" as song "stand" by "me" or as the whole title.
+    Every reading is searched at once and the result that best matches its
+    own title and artist wins, ties going to the first reading.
+    """
+    timer = timer or StageTimer()
+    search_results = await asyncio.gather(
+        *(timer.timed("search" if i == 0 else "search_alternative",
+                      search_track(sp, reading["song_name"], reading.get("artist_name")))
+          for i, reading in enumerate(readings))
+    )
+
+    best, best_score = None, -1.0
+    for reading, search_result in zip(readings, search_results):
+        items = search_result['tracks']['items'] if search_result else []
+        if not items:
+            continue
+        score = match_score(items[0], reading["song_name"], reading.get("artist_name"))
+        if score > best_score:
+            best, best_score = items[0], score
+    if len(readings) > 1 and best is not None:
+        logging.info("Picked reading", extra={"uri": best["uri"], "score": round(best_score, 2)})
+    return best
+
+
+async def prepare_track(sp, song_name, artist_name=None, timer=None, alternatives=None):
+    """Find the track and the device to play it on, without starting playback.
+
+    The search and the device lookup are independent, so they run
+    concurrently; the device lookup is skipped when a device is cached.
+    `alternatives` are other readings of an ambiguous command, see
+    resolve_track. Returns (track or None, device_id or None).
+    """
+    timer = timer or StageTimer()
+    logging.info("Searching song", extra={"song": song_name, "artist": artist_name})
+    readings = [{"song_name": song_name, "artist_name": artist_name}, *(alternatives or ())]
+    track, device_id = await asyncio.gather(resolve_track(sp, readings, timer), resolve_device(sp, timer))
+    return track, device_id
+
+
+async def play_prepared(sp, track, device_id, timer):
+    """Start a prepared track; returns the same result dict as play_track."""
+    if track is None:
+        return {"status": "not_found", "timings": timer.timings}
+    if device_id:
+        logging.info("Playing track", extra={"uri": track["uri"], "device_id": device_id})
+        device_id = await start_on_device(sp, device_id, [track['uri']], timer)
+    if not device_id:
+        return {"status": "no_devices", "track": track, "timings": timer.timings}
+    return {"status": "playing", "track": track, "device_id": device_id, "timings": timer.timings}
+
+
+def describe_play_result(result):
+    if result["status"] == "playing":
+        track = result["track"]
+        return f"Playing {track['name']} by {track['artists'][0]['name']}"
+    if result["status"] == "no_devices":
+        return "No active Spotify devices found"
+    return "Song not found"
+
+
+async def play_track(access_token, song_name, artist_name=None, timer=None, alternatives=None):
+    """Search for a track and start it on the user's device.
+
+    Returns a dict with a "status" of "playing", "not_found" or "no_devices".
+    """
+    timer = timer or StageTimer()
+    sp = spotify_client.for_token(access_token)
+    track, device_id = await prepare_track(sp, song_name, artist_name, timer, alternatives)
+    return await play_prepared(sp, track, device_id, timer)
+
+
+async def play_uri(access_token, song_uri, timer=None):
+    """Play a known track URI; returns the device used, or None if there is none."""
+    timer = timer or StageTimer()
+    sp = spotify_client.for_token(access_token)
+    device_id = await resolve_device(sp, timer)
+    if not device_id:
+        return None
+    return await start_on_device(sp, device_id, [song_uri], timer)
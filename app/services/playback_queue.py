@@ -0,0 +1,225 @@
+# playback_queue.py
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from fastapi import HTTPException
+from app.services.spotify_client import SpotifyException
+from app.services.metrics import registry
+
+# How long a volume/play/pause command waits before it is sent, so a newer
+# one in the same window can replace it
+PLAYBACK_DEBOUNCE_MS = float(os.getenv("PLAYBACK_DEBOUNCE_MS", "150"))
+PLAYBACK_QUEUE_SIZE = int(os.getenv("PLAYBACK_QUEUE_SIZE", "32"))
+# Finished jobs stay visible on the status endpoint for this long
+PLAYBACK_JOB_TTL = float(os.getenv("PLAYBACK_JOB_TTL", "300"))
+PLAYBACK_MAX_JOBS = int(os.getenv("PLAYBACK_MAX_JOBS", "10000"))
+
+# action -> coalescing group. A pending command is replaced by a newer one in
+# the same group; actions without a group (skip, queue, ...) are all sent.
+COALESCE_GROUPS = {
+    "play": "play",
+    "play_uri": "play",
+    "volume": "volume",
+    "volume_up": "volume",
+    "volume_down": "volume",
+    "pause": "transport",
+    "resume": "transport",
+}
+
+
+def coalesce(pending, new):
+    """The one command to send instead of `pending` followed by `new`, or None if both must be sent."""
+    group = COALESCE_GROUPS.get(new["action"])
+    if group is None or COALESCE_GROUPS.get(pending["action"]) != group:
+        return None
+    if "step" in new and "step" in pending:
+        # "up, up, up" is one step of 30
+        step = pending["step"] + new["step"]
+        return {**new, "action": "volume_up" if step >= 0 else "volume_down", "step": step}
+    if "step" in new and pending["action"] == "volume":
+        return {"action": "volume", "volume_level": max(0, min(100, pending["volume_level"] + new["step"]))}
+    return new
+
+
+class PlaybackQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many playback commands queued for this device")
+        self.retry_after = retry_after
+
+
+class PlaybackJob:
+    def __init__(self, device_key, command, handler):
+        self.id = uuid.uuid4().hex
+        self.device_key = device_key
+        self.command = command
+        self.handler = handler
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.replaced_by = None
+        self.created_at = time.time()
+        self.queued_at = time.monotonic()
+        self.finished_at = None
+        self.done = asyncio.Event()
+
+    def to_dict(self):
+        job = {"job_id": self.id, "status": self.status, "command": self.command, "created_at": self.created_at}
+        if self.status == "superseded":
+            job["superseded_by"] = self.replaced_by.id
+        if self.status == "done":
+            job["result"] = self.result
+        if self.status == "failed":
+            job["error"] = self.error
+            job["status_code"] = self.status_code
+        if self.finished_at is not None:
+            job["finished_at"] = self.finished_at
+        return job
+
+
+class PlaybackQueue:
+    """Per-device queues of playback commands, run in order in the background.
+
+    submit() returns a job right away and the device's worker task sends the
+    commands one at a time. Volume, play and pause/resume commands wait
+    `debounce` seconds first; a newer command of the same kind arriving in
+    that window replaces the pending one (volume steps add up), so a burst
+    of commands becomes one Spotify call. Commands without a device target
+    go to the user's active device, so the queue is keyed by user, and
+    handlers look up the user's current token when they run.
+    """
+
+    def __init__(self, debounce=PLAYBACK_DEBOUNCE_MS / 1000, queue_size=PLAYBACK_QUEUE_SIZE,
+                 job_ttl=PLAYBACK_JOB_TTL, max_jobs=PLAYBACK_MAX_JOBS):
+        self.debounce = debounce
+        self.queue_size = queue_size
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._pending = {}
+        self._workers = {}
+        self.submitted = 0
+        self.superseded = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, device_key, command, handler):
+        """Queue `await handler(command)` for the device and return its PlaybackJob."""
+        pending = self._pending.setdefault(device_key, deque())
+        job = PlaybackJob(device_key, command, handler)
+        # Only the most recent pending command of the same group can be replaced
+        replaced = None
+        group = COALESCE_GROUPS.get(command["action"])
+        for queued in reversed(pending) if group else ():
+            if COALESCE_GROUPS.get(queued.command["action"]) == group:
+                merged = coalesce(queued.command, command)
+                replaced = queued if merged is not None else None
+                break
+        if replaced is None and len(pending) >= self.queue_size:
+            raise PlaybackQueueFull(retry_after=max(1, round(self.debounce * len(pending))))
+
+        if replaced is not None:
+            pending.remove(replaced)
+            job.command = merged
+            replaced.status = "superseded"
+            replaced.replaced_by = job
+            replaced.finished_at = time.time()
+            replaced.done.set()
+            self.superseded += 1
+        pending.append(job)
+        self._remember(job)
+        self.submitted += 1
+        if device_key not in self._workers:
+            self._workers[device_key] = asyncio.create_task(self._drain(device_key, pending))
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def wait(self, job):
+        """Wait for the job, following it to the command that replaced it."""
+        while True:
+            await job.done.wait()
+            if job.replaced_by is None:
+                return job
+            job = job.replaced_by
+
+    async def _drain(self, device_key, pending):
+        try:
+            while pending:
+                job = pending[0]
+                if job.command["action"] in COALESCE_GROUPS:
+                    delay = job.queued_at + self.debounce - time.monotonic()
+                    if delay > 0:
+                        # The head may be replaced meanwhile, so look again after the wait
+                        await asyncio.sleep(delay)
+                        continue
+                pending.popleft()
+                await self._run(job)
+        finally:
+            del self._workers[device_key]
+            if not pending:
+                self._pending.pop(device_key, None)
+
+    async def _run(self, job):
+        job.status = "running"
+        try:
+            job.result = await job.handler(job.command)
+            job.status = "done"
+            self.completed += 1
+        except HTTPException as e:
+            job.status, job.status_code, job.error = "failed", e.status_code, e.detail
+        except SpotifyException as e:
+            job.status, job.status_code, job.error = "failed", e.http_status, e.msg
+        except Exception as e:
+            logging.error("Playback command failed", extra={"action": job.command["action"], "error": str(e)})
+            job.status, job.status_code, job.error = "failed", 500, str(e)
+        if job.status == "failed":
+            self.failed += 1
+        job.finished_at = time.time()
+        job.done.set()
+
+    def _remember(self, job):
+        self.jobs[job.id] = job
+        now = time.time()
+        while self.jobs:
+            oldest = next(iter(self.jobs.values()))
+            expired = oldest.finished_at is not None and oldest.finished_at < now - self.job_ttl
+            if not expired and len(self.jobs) <= self.max_jobs:
+                break
+            self.jobs.popitem(last=False)
+
+    def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+
+    def stats(self):
+        return {
+            "devices": len(self._pending),
+            "queued": sum(len(pending) for pending in self._pending.values()),
+            "submitted": self.submitted,
+            "superseded": self.superseded,
+            "completed": self.completed,
+            "failed": self.failed,
+            "jobs_tracked": len(self.jobs),
+        }
+
+
+playback_queue = PlaybackQueue()
+
+
+def _collect_queue():
+    stats = playback_queue.stats()
+    return [
+        ("playback_commands_queued", "gauge", "Playback commands waiting to be sent", [({}, stats["queued"])]),
+        ("playback_commands_submitted_total", "counter", "Playback commands accepted", [({}, stats["submitted"])]),
+        ("playback_commands_superseded_total", "counter", "Playback commands replaced by a newer one",
+         [({}, stats["superseded"])]),
+        ("playback_commands_failed_total", "counter", "Playback commands that failed", [({}, stats["failed"])]),
+    ]
+
+
+registry.register_collector(_collect_queue)
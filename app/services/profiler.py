@@ -0,0 +1,90 @@
+# profiler.py
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# Debug endpoints (profiler control) are only mounted when this is set
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock profiler that can be toggled on a live process.
+
+    A background thread snapshots every thread's stack each interval and
+    counts them as collapsed stacks ("outer;inner;leaf count"), the input
+    format of flamegraph.pl and speedscope. Nothing is hooked into the code
+    being profiled, so the cost while stopped is zero.
+    """
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS, max_depth=64):
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None):
+        if self.running:
+            return False
+        if interval_ms:
+            self.interval = interval_ms / 1000
+        self.samples.clear()
+        self.sample_count = 0
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.time()
+        return True
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples[self._collapse(frame)] += 1
+            self.sample_count += 1
+
+    def _collapse(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most frequent first."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(limit)) + "\n"
+
+    def stats(self):
+        end = self.stopped_at or time.time()
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.sample_count,
+            "unique_stacks": len(self.samples),
+            "duration_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,60 @@
+# rate_limit.py
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Async token-bucket limiter: `rate` calls per second with bursts up to `burst`.
+
+    pause() blocks every caller until a deadline, which is how a 429's
+    Retry-After is applied to all traffic rather than just the call that
+    got it. A rate of 0 disables limiting but still honours pauses.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds_total = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+            elif not self.rate:
+                break
+            else:
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                delay = (1 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+        self.acquired += 1
+        if waited:
+            self.throttled += 1
+            self.wait_seconds_total += waited
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "paused_for": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+        }
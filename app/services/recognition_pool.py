@@ -0,0 +1,155 @@
+# recognition_pool.py
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from app.services.voice_recognition import recognize, warm_up as warm_up_recognizer
+from app.services.metrics import registry
+
+RECOGNITION_EXECUTOR = os.getenv("RECOGNITION_EXECUTOR", "thread")
+RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "4"))
+RECOGNITION_QUEUE_SIZE = int(os.getenv("RECOGNITION_QUEUE_SIZE", "16"))
+RECOGNITION_TIMEOUT = float(os.getenv("RECOGNITION_TIMEOUT", "15"))
+
+
+class RecognitionPoolFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Speech recognition queue is full")
+        self.retry_after = retry_after
+
+
+class RecognitionTimeout(Exception):
+    pass
+
+
+def _timed_call(recognize, enqueued_at, audio, kwargs):
+    # Runs in the worker; wall-clock times so it also works across processes
+    started_at = time.time()
+    result = recognize(audio, **kwargs)
+    return result, started_at - enqueued_at, time.time() - started_at
+
+
+class RecognitionPool:
+    """Runs blocking speech recognition off the event loop with a bounded queue.
+
+    At most `workers` jobs run at once and `queue_size` more may wait; beyond
+    that submit() raises RecognitionPoolFull so the endpoint can shed load.
+    The recognize callable is injectable so tests can swap in a stub engine.
+    """
+
+    def __init__(self, recognize=recognize, workers=RECOGNITION_WORKERS, queue_size=RECOGNITION_QUEUE_SIZE,
+                 timeout=RECOGNITION_TIMEOUT, executor=RECOGNITION_EXECUTOR):
+        self.recognize = recognize
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.executor_kind = executor
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_max = 0.0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recognizer")
+        return self._executor
+
+    @property
+    def queue_depth(self):
+        return max(0, self.pending - self.workers)
+
+    def retry_after(self):
+        # Rough time for the queue ahead of a new job to drain
+        mean_run = self.run_seconds_total / self.completed if self.completed else 1.0
+        return max(1, int(mean_run * (self.queue_depth + 1) / self.workers + 0.5))
+
+    def _release(self, future):
+        self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, wait, run = future.result()
+        self.completed += 1
+        self.wait_seconds_total += wait
+        self.run_seconds_total += run
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.run_seconds_max = max(self.run_seconds_max, run)
+
+    async def submit(self, audio, **kwargs):
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            raise RecognitionPoolFull(self.retry_after())
+
+        if self.executor_kind == "process" and hasattr(audio, "read"):
+            # File objects can't be pickled across to another process
+            audio = audio.read()
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = loop.run_in_executor(self.executor, _timed_call, self.recognize, time.time(), audio, kwargs)
+        # The slot is freed when the worker actually finishes, not when we stop waiting
+        future.add_done_callback(self._release)
+        try:
+            result, _, _ = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logging.warning("Speech recognition timed out", extra={"timeout": self.timeout})
+            raise RecognitionTimeout(f"Speech recognition timed out after {self.timeout:g}s")
+        return result
+
+    async def warm_up(self, hold_seconds=0.05):
+        """Start every worker and build its recognizer before the first request."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, warm_up_recognizer, hold_seconds)
+                               for _ in range(self.workers)))
+
+    def stats(self):
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_seconds_mean": self.wait_seconds_total / self.completed if self.completed else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+            "run_seconds_mean": self.run_seconds_total / self.completed if self.completed else 0.0,
+            "run_seconds_max": self.run_seconds_max,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+recognition_pool = RecognitionPool()
+
+
+def _collect_pool():
+    stats = recognition_pool.stats()
+    return [
+        ("recognition_queue_depth", "gauge", "Recognition jobs waiting for a worker", [({}, stats["queue_depth"])]),
+        ("recognition_in_flight", "gauge", "Recognition jobs running", [({}, stats["in_flight"])]),
+        ("recognition_completed_total", "counter", "Recognition jobs completed", [({}, stats["completed"])]),
+        ("recognition_rejected_total", "counter", "Recognition jobs shed with 503", [({}, stats["rejected"])]),
+        ("recognition_timeouts_total", "counter", "Recognition jobs that timed out", [({}, stats["timeouts"])]),
+        ("recognition_wait_seconds_mean", "gauge", "Mean time a job waited for a worker",
+         [({}, round(stats["wait_seconds_mean"], 6))]),
+        ("recognition_run_seconds_mean", "gauge", "Mean recognition run time",
+         [({}, round(stats["run_seconds_mean"], 6))]),
+    ]
+
+
+registry.register_collector(_collect_pool)
@@ -0,0 +1,173 @@
+# search_cache.py
+import os
+import re
+import json
+import time
+import logging
+from collections import OrderedDict
+from app.services.track_index import track_index
+from app.services.metrics import register_cache
+
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_MAXSIZE = int(os.getenv("SEARCH_CACHE_MAXSIZE", "2048"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    if not text:
+        return ""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+def make_key(song_name, artist_name=None):
+    return f"{normalize(song_name)}|{normalize(artist_name)}"
+
+
+def build_search_query(song_name, artist_name=None):
+    return f"{song_name} artist:{artist_name}" if artist_name else song_name
+
+
+class SearchCache:
+    """In-process LRU cache with a per-entry TTL for Spotify search results."""
+
+    def __init__(self, maxsize=SEARCH_CACHE_MAXSIZE, ttl=SEARCH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RedisSearchCache:
+    """Search cache shared between uvicorn workers through Redis.
+
+    Entries expire with the TTL; size-based eviction is left to the Redis
+    server's maxmemory policy (allkeys-lru). If Redis is unreachable a
+    lookup counts as a miss and a write is skipped, so search falls back
+    to Spotify instead of failing.
+    """
+
+    def __init__(self, url=REDIS_URL, ttl=SEARCH_CACHE_TTL, prefix="search:"):
+        import redis.asyncio as redis
+        from redis.exceptions import RedisError
+
+        self._redis = redis.from_url(url)
+        self._errors = RedisError
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key):
+        try:
+            raw = await self._redis.get(self.prefix + key)
+        except self._errors as e:
+            self.errors += 1
+            logging.warning("Redis search cache lookup failed", extra={"error": str(e)})
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key, value):
+        try:
+            await self._redis.set(self.prefix + key, json.dumps(value), ex=int(self.ttl))
+        except self._errors as e:
+            self.errors += 1
+            logging.warning("Redis search cache write failed", extra={"error": str(e)})
+
+    async def clear(self):
+        async for key in self._redis.scan_iter(match=self.prefix + "*"):
+            await self._redis.delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_search_cache(backend=SEARCH_CACHE_BACKEND):
+    if backend == "redis":
+        try:
+            return RedisSearchCache()
+        except ImportError:
+            logging.warning("redis is not installed, falling back to the in-process search cache")
+    return SearchCache()
+
+
+search_cache = create_search_cache()
+register_cache("search", search_cache.stats)
+
+
+async def search_track(sp, song_name, artist_name=None, cache=None, use_index=True):
+    """Return the Spotify search payload for a song, from local state when possible.
+
+    The exact-match cache is tried first, then the fuzzy track index, and
+    only then Spotify search. Tracks found by search are added to the index.
+    """
+    cache = cache or search_cache
+    key = make_key(song_name, artist_name)
+    result = await cache.get(key)
+    if result is not None:
+        return result
+
+    if use_index:
+        match = track_index.lookup(song_name, artist_name)
+        if match is not None:
+            track, score = match
+            logging.info("Resolved track locally",
+                         extra={"song": song_name, "uri": track["uri"], "score": round(score, 2)})
+            return {"tracks": {"items": [track], "total": 1}}
+
+    result = await sp.search(q=build_search_query(song_name, artist_name), type='track', limit=1)
+    # Only cache hits; a miss may just be a mis-recognized title
+    if result and result.get('tracks', {}).get('items'):
+        await cache.set(key, result)
+        track_index.add_spotify_track(result['tracks']['items'][0])
+    return result
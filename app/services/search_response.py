@@ -0,0 +1,87 @@
+# search_response.py
+import json
+import hashlib
+from fastapi import HTTPException
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Spotify's search payload has album art, available markets and more for
+# every track; clients mostly need these
+DEFAULT_SEARCH_FIELDS = ("uri", "name", "artist")
+# fields=raw returns Spotify's payload unchanged
+RAW_FIELDS = "raw"
+
+
+def _first_artist(track):
+    artists = track.get("artists") or ()
+    return artists[0].get("name") if artists else None
+
+
+def _image(track):
+    images = (track.get("album") or {}).get("images") or ()
+    return images[0].get("url") if images else None
+
+
+TRACK_FIELDS = {
+    "uri": lambda track: track.get("uri"),
+    "id": lambda track: track.get("id"),
+    "name": lambda track: track.get("name"),
+    "artist": _first_artist,
+    "artists": lambda track: [artist.get("name") for artist in track.get("artists") or ()],
+    "album": lambda track: (track.get("album") or {}).get("name"),
+    "image": _image,
+    "duration_ms": lambda track: track.get("duration_ms"),
+    "popularity": lambda track: track.get("popularity"),
+    "explicit": lambda track: track.get("explicit"),
+    "preview_url": lambda track: track.get("preview_url"),
+    "external_url": lambda track: (track.get("external_urls") or {}).get("spotify"),
+}
+
+
+def parse_fields(fields):
+    """Field names from a comma separated fields= value, or None for the raw payload."""
+    if not fields:
+        return DEFAULT_SEARCH_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if names == (RAW_FIELDS,):
+        return None
+    unknown = [name for name in names if name not in TRACK_FIELDS]
+    if unknown or not names:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields {unknown}, expected some of {sorted(TRACK_FIELDS)} or 'raw'")
+    return names
+
+
+def project(search_results, fields):
+    """{"tracks": [{field: value}], "total": n} from a Spotify search payload."""
+    if fields is None:
+        return search_results
+    tracks = (search_results or {}).get("tracks") or {}
+    items = tracks.get("items") or []
+    return {"tracks": [{name: TRACK_FIELDS[name](track) for name in fields} for track in items],
+            "total": tracks.get("total", len(items))}
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def make_etag(cache_key, fields, body):
+    """Strong ETag for one search response: the search cache key, the projection and the body."""
+    label = RAW_FIELDS if fields is None else ",".join(fields)
+    digest = hashlib.blake2b(f"{cache_key}|{label}".encode(), digest_size=12)
+    digest.update(body)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
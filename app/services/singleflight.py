@@ -0,0 +1,42 @@
+# singleflight.py
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight call.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result (or exception). Once it finishes the
+    key is forgotten, so later calls start fresh.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            future.exception()
+
+    async def do(self, key, fn):
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so one waiter giving up doesn't cancel the shared work
+        return await asyncio.shield(future)
+
+    @property
+    def in_flight(self):
+        return len(self._inflight)
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": self.in_flight}
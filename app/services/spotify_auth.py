@@ -1,20 +1,21 @@
 import os
-import json
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 import logging
-from fastapi.responses import RedirectResponse
-import requests  # Ensure you have this import for logging requests
+from app.services.play_pipeline import play_track
+from app.services.metrics import register_cache
+from app.services.token_store import FileTokenStore, create_token_store
+from app.services.user_session import current_user, DEFAULT_USER
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-
-# Path to the file where tokens are stored
-TOKEN_STORAGE_FILE = "token_info.json"
-
-scope = "user-modify-playback-state user-read-playback-state user-read-currently-playing"
+scope = "user-modify-playback-state user-read-playback-state user-read-currently-playing user-library-read user-read-recently-played"
 
 def create_spotify_oauth():
+    # spotipy pulls in requests and redis; only load it once OAuth is needed
+    from spotipy.oauth2 import SpotifyOAuth
+    from spotipy.cache_handler import MemoryCacheHandler
+
     SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
     SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
     SPOTIPY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI")
@@ -23,85 +24,231 @@ def create_spotify_oauth():
         client_id=SPOTIPY_CLIENT_ID,
         client_secret=SPOTIPY_CLIENT_SECRET,
         redirect_uri=SPOTIPY_REDIRECT_URI,
-        scope=scope
+        scope=scope,
+        # Tokens live in the token store, per user. spotipy's default ".cache"
+        # file is shared by everyone and would hand one user's token to another.
+        cache_handler=MemoryCacheHandler(),
     )
 
-def get_spotify_token():
-    if os.path.exists(TOKEN_STORAGE_FILE):
-        logging.info("Token file found, attempting to retrieve token")
-        try:
-            with open(TOKEN_STORAGE_FILE, 'r') as token_file:
-                token_info = json.load(token_file)
-        except json.JSONDecodeError:
-            logging.error("Invalid JSON in token file, deleting file")
-            os.remove(TOKEN_STORAGE_FILE)
-            return None
-
-        # Check if token is expired and refresh if necessary
-        oauth = create_spotify_oauth()
-        if oauth.is_token_expired(token_info):
-            logging.info("Token expired, attempting to refresh")
+# Refresh the token this many seconds before Spotify says it expires
+REFRESH_MARGIN_SECONDS = 60
+# Tokens kept in memory per worker; 0 sends every lookup to the store
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+_LOCK_STRIPES = 64
+
+
+class TokenManager:
+    """Per-user Spotify tokens: a read-through memory cache over a token store.
+
+    A lookup is served from memory and only goes to the store on a cache
+    miss or when the token is within refresh_margin of expiring. Near expiry
+    the token is refreshed in the background while the current one is still
+    returned; an already expired token is refreshed inline. Refreshes are
+    single-flight per user, and re-read the store first in case another
+    worker or node already refreshed.
+    """
+
+    def __init__(self, backend=None, path=None, refresh_margin=REFRESH_MARGIN_SECONDS, oauth_factory=None,
+                 cache_size=TOKEN_CACHE_SIZE):
+        self.backend = backend or (FileTokenStore(path) if path else create_token_store())
+        self.refresh_margin = refresh_margin
+        self.cache_size = cache_size
+        self._oauth_factory = oauth_factory or create_spotify_oauth
+        self._oauth = None
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Striped so refreshes for different users don't wait on each other
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._refreshing = set()
+        # Counters, useful for benchmarks and debugging
+        self.hits = 0
+        self.misses = 0
+        self.refresh_count = 0
+        self.background_refreshes = 0
+
+    def _get_oauth(self):
+        if self._oauth is None:
+            self._oauth = self._oauth_factory()
+        return self._oauth
+
+    @property
+    def oauth(self):
+        return self._get_oauth()
+
+    def warm_up(self):
+        """Build the OAuth client, open the store and load the default user's token."""
+        self._get_oauth()
+        self.backend.open()
+        self.get_token_info(DEFAULT_USER)
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % _LOCK_STRIPES]
+
+    def _cached(self, user_id):
+        with self._cache_lock:
+            token_info = self._cache.get(user_id)
+            if token_info is not None:
+                self._cache.move_to_end(user_id)
+            return token_info
+
+    def _remember(self, user_id, token_info):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[user_id] = token_info
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _expires_in(self, token_info):
+        return token_info.get('expires_at', 0) - time.time()
+
+    def _is_fresh(self, token_info):
+        return token_info is not None and self._expires_in(token_info) > self.refresh_margin
+
+    def _refresh(self, user_id, stale_token_info):
+        with self._lock_for(user_id):
+            # Another thread, worker or node may have refreshed while we waited
+            current = self._cached(user_id)
+            if current is not stale_token_info and self._is_fresh(current):
+                return current
+            stored = self.backend.get(user_id)
+            if stored != stale_token_info and self._is_fresh(stored):
+                self._remember(user_id, stored)
+                return stored
+
+            logging.info("Token expiring, attempting to refresh")
             try:
-                token_info = oauth.refresh_access_token(token_info['refresh_token'])
+                self.refresh_count += 1
+                token_info = self._get_oauth().refresh_access_token(stale_token_info['refresh_token'])
                 logging.info("Token refreshed successfully")
             except Exception as e:
-                logging.error(f"Error refreshing token: {str(e)}")
+                logging.error("Error refreshing token", extra={"error": str(e)})
                 return None
 
-            # Save refreshed token
-            with open(TOKEN_STORAGE_FILE, 'w') as token_file:
-                json.dump(token_info, token_file)
+            self._set(user_id, token_info)
+            return token_info
+
+    def _refresh_in_background(self, user_id, token_info):
+        with self._cache_lock:
+            if user_id in self._refreshing:
+                return
+            self._refreshing.add(user_id)
+        self.background_refreshes += 1
 
-        return token_info['access_token']
+        def run():
+            try:
+                if self._refresh(user_id, token_info) is None:
+                    logging.warning("Background token refresh failed, will retry on next request")
+            finally:
+                with self._cache_lock:
+                    self._refreshing.discard(user_id)
+
+        threading.Thread(target=run, name="token-refresh", daemon=True).start()
+
+    def _set(self, user_id, token_info):
+        if token_info != self._cached(user_id):
+            self.backend.put(user_id, token_info)
+        self._remember(user_id, token_info)
+
+    def store(self, token_info, user_id=None):
+        """Save a user's token, e.g. after the OAuth callback."""
+        user_id = user_id or current_user.get()
+        with self._lock_for(user_id):
+            self._set(user_id, token_info)
+
+    def get_token_info(self, user_id=None):
+        user_id = user_id or current_user.get()
+        token_info = self._cached(user_id)
+        if token_info is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            token_info = self.backend.get(user_id)
+            if token_info is None:
+                return None
+            self._remember(user_id, token_info)
+
+        expires_in = self._expires_in(token_info)
+        if expires_in <= 0:
+            return self._refresh(user_id, token_info)
+        if expires_in <= self.refresh_margin and token_info.get('refresh_token'):
+            self._refresh_in_background(user_id, token_info)
+        return token_info
+
+    async def get_token_info_async(self, user_id=None):
+        """get_token_info for the event loop: store reads and inline refreshes run in a thread."""
+        user_id = user_id or current_user.get()
+        token_info = self._cached(user_id)
+        if token_info is None or self._expires_in(token_info) <= 0:
+            return await asyncio.to_thread(self.get_token_info, user_id)
+        self.hits += 1
+        if self._expires_in(token_info) <= self.refresh_margin and token_info.get('refresh_token'):
+            self._refresh_in_background(user_id, token_info)
+        return token_info
+
+    def get_access_token(self, user_id=None):
+        token_info = self.get_token_info(user_id)
+        return token_info['access_token'] if token_info else None
+
+    async def get_access_token_async(self, user_id=None):
+        token_info = await self.get_token_info_async(user_id)
+        return token_info['access_token'] if token_info else None
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "refreshes": self.refresh_count,
+            "background_refreshes": self.background_refreshes,
+            "store": self.backend.stats(),
+        }
+
+
+token_manager = TokenManager()
+register_cache("token", token_manager.stats)
+
+
+def get_spotify_token(user_id=None):
+    access_token = token_manager.get_access_token(user_id)
+    if access_token:
+        return access_token
 
     # If no token, return None, and handle redirection in the calling function
     logging.warning("No token found, redirecting to login.")
     return None
 
 
-def log_request_response(url, method, headers, data):
-    response = requests.request(method, url, headers=headers, data=data)
-    logging.info(f"Request: {method} {url}")
-    logging.info(f"Headers: {headers}")
-    logging.info(f"Data: {data}")
-    logging.info(f"Response: {response.text}")
-    return response
+async def get_spotify_token_async(user_id=None):
+    """get_spotify_token for async handlers; it never blocks the event loop."""
+    access_token = await token_manager.get_access_token_async(user_id)
+    if access_token:
+        return access_token
+
+    logging.warning("No token found, redirecting to login.")
+    return None
 
 
-def play_spotify_song(access_token, song_name, artist_name=None):
+async def play_spotify_song(access_token, song_name, artist_name=None):
     try:
-        sp = spotipy.Spotify(auth=access_token)
+        logging.info("Searching for song", extra={"song": song_name, "artist": artist_name})
 
-        if artist_name:
-            logging.info(f"Searching for song: {song_name} by {artist_name}")
-            query = f"{song_name} artist:{artist_name}"
-        else:
-            logging.info(f"Searching for song: {song_name}")
-            query = song_name
-
-        # Log the search request
-        log_request_response(f"https://api.spotify.com/v1/search?q={query}&type=track", method='GET', headers={'Authorization': f'Bearer {access_token}'})
-
-        results = sp.search(q=query, type='track')
-
-        if results['tracks']['total'] > 0:
-            track_uri = results['tracks']['items'][0]['uri']
-            logging.info(f"Track found: {track_uri}")
-            
-            devices = sp.devices()
-            logging.info(f"Devices found: {devices}")
-
-            if devices['devices']:
-                device_id = devices['devices'][0]['id']
-                logging.info(f"Playing on device: {device_id}")
-                sp.start_playback(device_id=device_id, uris=[track_uri])
-            else:
-                logging.warning("No active Spotify devices found.")
-                raise Exception("No active Spotify devices found.")
-        else:
-            logging.warning(f"Song not found: {song_name} by {artist_name}")
+        result = await play_track(access_token, song_name, artist_name)
+
+        if result["status"] == "not_found":
+            logging.warning("Song not found", extra={"song": song_name, "artist": artist_name})
             raise Exception(f"Song not found: {song_name} by {artist_name}")
+        if result["status"] == "no_devices":
+            logging.warning("No active Spotify devices found.")
+            raise Exception("No active Spotify devices found.")
+        logging.info("Playing track", extra={"uri": result["track"]["uri"], "device_id": result["device_id"]})
 
     except Exception as e:
-        logging.error(f"Error in play_spotify_song: {str(e)}")
+        logging.error("Error in play_spotify_song", extra={"error": str(e)})
         raise e
@@ -0,0 +1,238 @@
+# spotify_client.py
+import os
+import time
+import asyncio
+import random
+import logging
+import httpx
+from app.services.metrics import registry, SPOTIFY_IN_FLIGHT, SPOTIFY_REQUESTS_TOTAL, SPOTIFY_REQUEST_SECONDS
+from app.services.rate_limit import TokenBucket
+from app.services.singleflight import SingleFlight
+
+SPOTIFY_API_BASE_URL = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1")
+# Client-side budget for Spotify calls per second; 0 disables the limiter
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "20"))
+SPOTIFY_RATE_BURST = int(os.getenv("SPOTIFY_RATE_BURST", "40"))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+# A 429 asking us to wait longer than this is returned to the caller instead
+SPOTIFY_MAX_RETRY_WAIT = float(os.getenv("SPOTIFY_MAX_RETRY_WAIT", "10"))
+SPOTIFY_BACKOFF_BASE = float(os.getenv("SPOTIFY_BACKOFF_BASE", "0.5"))
+
+
+class SpotifyException(Exception):
+    """Error from the Spotify Web API.
+
+    Carries the same fields as spotipy.SpotifyException, so handlers written
+    against spotipy keep working, without importing spotipy (and with it
+    requests and redis) at startup.
+    """
+
+    def __init__(self, http_status, code, msg, reason=None, headers=None):
+        super().__init__(msg)
+        self.http_status = http_status
+        self.code = code
+        self.msg = msg
+        self.reason = reason
+        self.headers = headers or {}
+
+    def __str__(self):
+        return f"http status: {self.http_status}, code: {self.code} - {self.msg}, reason: {self.reason}"
+
+
+class SpotifyClient:
+    """Shared, non-blocking gateway for the Spotify Web API.
+
+    One httpx.AsyncClient is kept for the lifetime of the app so connections
+    are pooled and kept alive between requests. Every call passes a
+    token-bucket limiter; a 429 pauses the limiter for Retry-After plus
+    jitter and the call is retried. Identical concurrent GETs for the same
+    token share one in-flight request. Errors are raised as
+    SpotifyException.
+    """
+
+    def __init__(self, base_url=SPOTIFY_API_BASE_URL, max_connections=100, max_keepalive_connections=20,
+                 keepalive_expiry=30.0, timeout=10.0, rate_limit=SPOTIFY_RATE_LIMIT, rate_burst=SPOTIFY_RATE_BURST,
+                 max_retries=SPOTIFY_MAX_RETRIES, max_retry_wait=SPOTIFY_MAX_RETRY_WAIT,
+                 backoff_base=SPOTIFY_BACKOFF_BASE):
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self._http = None
+        self.limiter = TokenBucket(rate_limit, rate_burst)
+        self.coalescer = SingleFlight()
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.backoff_base = backoff_base
+        self.rate_limited = 0
+        self.retries = 0
+
+    @property
+    def http(self):
+        # Created lazily so scripts can use the client without the app lifespan
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+        return self._http
+
+    async def start(self):
+        return self.http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def warm_up(self, connections=4):
+        """Open pooled connections (TCP and TLS) ahead of the first real request."""
+        async def touch():
+            try:
+                await self.http.request("HEAD", "/")
+            except httpx.HTTPError as e:
+                logging.warning("Could not pre-open Spotify connection", extra={"error": str(e)})
+
+        await asyncio.gather(*(touch() for _ in range(connections)))
+
+    async def request(self, method, path, access_token, params=None, json=None):
+        if method == "GET":
+            key = (path, access_token, tuple(sorted((params or {}).items())))
+            return await self.coalescer.do(key, lambda: self._request(method, path, access_token, params, json))
+        return await self._request(method, path, access_token, params, json)
+
+    async def _send(self, method, path, headers, params, json):
+        start = time.perf_counter()
+        status = "error"
+        SPOTIFY_IN_FLIGHT.inc()
+        try:
+            response = await self.http.request(method, path, headers=headers, params=params, json=json)
+            status = response.status_code
+            return response
+        finally:
+            SPOTIFY_IN_FLIGHT.dec()
+            SPOTIFY_REQUESTS_TOTAL.inc(method=method, endpoint=path, status=status)
+            SPOTIFY_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, endpoint=path)
+
+    def _retry_delay(self, response, attempt):
+        try:
+            retry_after = float(response.headers.get("Retry-After", ""))
+        except ValueError:
+            retry_after = self.backoff_base * 2 ** attempt
+        # Jitter spreads out the retries of everyone who was paused together
+        return retry_after + random.uniform(0, self.backoff_base * 2 ** attempt)
+
+    async def _request(self, method, path, access_token, params, json):
+        headers = {"Authorization": f"Bearer {access_token}"}
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            response = await self._send(method, path, headers, params, json)
+            if response.status_code != 429:
+                break
+            self.rate_limited += 1
+            delay = self._retry_delay(response, attempt)
+            if attempt == self.max_retries or delay > self.max_retry_wait:
+                break
+            self.retries += 1
+            logging.warning("Spotify rate limited, backing off",
+                            extra={"endpoint": path, "delay": round(delay, 3), "attempt": attempt + 1})
+            self.limiter.pause(delay)
+
+        if response.status_code >= 400:
+            msg, reason = response.text, None
+            try:
+                error = response.json().get("error", {})
+                if isinstance(error, dict):
+                    msg = error.get("message", msg)
+                    reason = error.get("reason")
+            except ValueError:
+                pass
+            raise SpotifyException(response.status_code, -1, f"{response.url}:\n {msg}",
+                                   reason=reason, headers=response.headers)
+
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    def stats(self):
+        return {"limiter": self.limiter.stats(), "coalescing": self.coalescer.stats(),
+                "rate_limited": self.rate_limited, "retries": self.retries}
+
+    def for_token(self, access_token):
+        return SpotifyUserClient(self, access_token)
+
+
+class SpotifyUserClient:
+    """Binds the shared client to one access token, mirroring the spotipy calls we use."""
+
+    def __init__(self, client, access_token):
+        self.client = client
+        self.access_token = access_token
+
+    async def search(self, q, limit=10, type="track"):
+        return await self.client.request("GET", "/search", self.access_token,
+                                         params={"q": q, "limit": limit, "type": type})
+
+    async def devices(self):
+        return await self.client.request("GET", "/me/player/devices", self.access_token)
+
+    async def start_playback(self, device_id=None, uris=None):
+        params = {"device_id": device_id} if device_id else None
+        body = {"uris": uris} if uris else None
+        return await self.client.request("PUT", "/me/player/play", self.access_token, params=params, json=body)
+
+    async def pause_playback(self, device_id=None):
+        params = {"device_id": device_id} if device_id else None
+        return await self.client.request("PUT", "/me/player/pause", self.access_token, params=params)
+
+    async def next_track(self, device_id=None):
+        params = {"device_id": device_id} if device_id else None
+        return await self.client.request("POST", "/me/player/next", self.access_token, params=params)
+
+    async def previous_track(self, device_id=None):
+        params = {"device_id": device_id} if device_id else None
+        return await self.client.request("POST", "/me/player/previous", self.access_token, params=params)
+
+    async def add_to_queue(self, uri, device_id=None):
+        params = {"uri": uri}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.client.request("POST", "/me/player/queue", self.access_token, params=params)
+
+    async def current_playback(self):
+        return await self.client.request("GET", "/me/player", self.access_token)
+
+    async def saved_tracks(self, limit=50, offset=0):
+        return await self.client.request("GET", "/me/tracks", self.access_token,
+                                         params={"limit": limit, "offset": offset})
+
+    async def recently_played(self, limit=50):
+        return await self.client.request("GET", "/me/player/recently-played", self.access_token,
+                                         params={"limit": limit})
+
+    async def volume(self, volume_percent, device_id=None):
+        params = {"volume_percent": volume_percent}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.client.request("PUT", "/me/player/volume", self.access_token, params=params)
+
+
+spotify_client = SpotifyClient()
+
+
+def _collect_gateway():
+    stats = spotify_client.stats()
+    limiter, coalescing = stats["limiter"], stats["coalescing"]
+    return [
+        ("spotify_rate_limited_total", "counter", "429 responses from Spotify", [({}, stats["rate_limited"])]),
+        ("spotify_retries_total", "counter", "Spotify calls retried after a 429", [({}, stats["retries"])]),
+        ("spotify_coalesced_total", "counter", "GETs served by an identical in-flight request",
+         [({}, coalescing["coalesced"])]),
+        ("spotify_limiter_throttled_total", "counter", "Spotify calls delayed by the client-side limiter",
+         [({}, limiter["throttled"])]),
+        ("spotify_limiter_wait_seconds_total", "counter", "Time Spotify calls spent waiting on the limiter",
+         [({}, limiter["wait_seconds_total"])]),
+    ]
+
+
+registry.register_collector(_collect_gateway)
@@ -1,52 +1,36 @@
-import requests
 from fastapi import HTTPException
 import logging
-import requests
-from fastapi import HTTPException
-from app.services.spotify_auth import log_request_response
-import json
-
-def play_song_on_spotify(access_token, device_id, song_uri):
-    url = f"https://api.spotify.com/v1/me/player/play?device_id={device_id}"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "uris": [song_uri]
-    }
-
-    response = log_request_response(url, method='PUT', headers=headers, data=json.dumps(payload))
-
-    if isinstance(response, str):  # Check if response is a string
-        logging.error(f"Error: {response}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
-    else:
-        if response.status_code == 403:
-            raise HTTPException(status_code=403, detail="Premium required")
-        elif response.status_code != 204:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+from app.services.spotify_client import spotify_client, SpotifyException
+
+def spotify_error(e):
+    """Map a SpotifyException to the HTTPException our endpoints return."""
+    if e.http_status == 403:
+        return HTTPException(status_code=403, detail="Premium required")
+    if e.http_status == 429:
+        # Still rate limited after the gateway's retries; pass the wait on to the caller
+        retry_after = (e.headers or {}).get("Retry-After", "1")
+        return HTTPException(status_code=429, detail="Spotify rate limit reached, try again later",
+                             headers={"Retry-After": retry_after})
+    return HTTPException(status_code=e.http_status, detail=e.msg)
 
-    return response
-# Other Spotify-related functions can go here
 
+async def play_song_on_spotify(access_token, device_id, song_uri):
+    sp = spotify_client.for_token(access_token)
 
-def get_spotify_devices(access_token: str):
-    print(type(access_token))  # Print the type of access_token
-    print(access_token)  # Print the contents of access_token
+    try:
+        response = await sp.start_playback(device_id=device_id, uris=[song_uri])
+    except SpotifyException as e:
+        logging.error("Spotify playback failed", extra={"status": e.http_status, "error": e.msg})
+        raise spotify_error(e)
+
+    return response
+# Other Spotify-related functions can go here
 
-    url = "https://api.spotify.com/v1/me/player/devices"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
 
-    response = requests.get(url, headers=headers)
-    print(type(response))  # Print the type of response
-    print(response)  # Print the contents of response
+async def get_spotify_devices(access_token: str):
+    sp = spotify_client.for_token(access_token)
 
-    if response.status_code == 200:
-        print(type(response.json()))  # Print the type of response.json()
-        print(response.json())  # Print the contents of response.json()
-        return response.json()
-    else:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
\ No newline at end of file
+    try:
+        return await sp.devices()
+    except SpotifyException as e:
+        raise spotify_error(e)
@@ -0,0 +1,31 @@
+# timing.py
+import time
+from contextlib import contextmanager
+from app.services.metrics import STAGE_SECONDS
+
+
+class StageTimer:
+    """Collects wall-clock milliseconds per named stage of a request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed * 1000, 2)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+
+    async def timed(self, name, awaitable):
+        # For stages that run concurrently under asyncio.gather
+        with self.stage(name):
+            return await awaitable
+
+    def total(self):
+        self.timings["total"] = round((time.perf_counter() - self.start) * 1000, 2)
+        return self.timings
@@ -0,0 +1,253 @@
+# token_store.py
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import logging
+import threading
+from contextlib import contextmanager
+from app.services.user_session import DEFAULT_USER
+
+# Where Spotify tokens are persisted: "file" (single JSON file), "sqlite" or "postgres"
+TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "file")
+TOKEN_STORAGE_FILE = "token_info.json"
+TOKEN_STORE_PATH = os.getenv("TOKEN_STORE_PATH", "tokens.db")
+TOKEN_STORE_DSN = os.getenv("TOKEN_STORE_DSN", os.getenv("DATABASE_URL"))
+TOKEN_STORE_POOL_MIN = int(os.getenv("TOKEN_STORE_POOL_MIN", "1"))
+TOKEN_STORE_POOL_MAX = int(os.getenv("TOKEN_STORE_POOL_MAX", "10"))
+
+
+class FileTokenStore:
+    """Tokens in one JSON file, {user_id: token_info}.
+
+    A file holding a single token (the old format) is read as the default
+    user's. Writes replace the file atomically, but concurrent writers in
+    several processes can still lose updates, so use sqlite or postgres for
+    more than one worker.
+    """
+
+    def __init__(self, path=TOKEN_STORAGE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def _read_all(self):
+        if not os.path.exists(self.path):
+            return {}
+        self.reads += 1
+        try:
+            with open(self.path, 'r') as token_file:
+                tokens = json.load(token_file)
+        except json.JSONDecodeError:
+            logging.error("Invalid JSON in token file, deleting file", extra={"path": self.path})
+            os.remove(self.path)
+            return {}
+        if "access_token" in tokens:
+            return {DEFAULT_USER: tokens}
+        return tokens
+
+    def _write_all(self, tokens):
+        # Legacy layout while only the default user exists, so older code can still read it
+        if set(tokens) == {DEFAULT_USER}:
+            tokens = tokens[DEFAULT_USER]
+        # Write to a temp file next to the target and rename it into place so
+        # a reader never sees a half-written file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token_info.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as token_file:
+                json.dump(tokens, token_file)
+                token_file.flush()
+                os.fsync(token_file.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.writes += 1
+
+    def get(self, user_id):
+        with self._lock:
+            return self._read_all().get(user_id)
+
+    def put(self, user_id, token_info):
+        with self._lock:
+            tokens = self._read_all()
+            tokens[user_id] = token_info
+            self._write_all(tokens)
+
+    def delete(self, user_id):
+        with self._lock:
+            tokens = self._read_all()
+            if tokens.pop(user_id, None) is not None:
+                self._write_all(tokens)
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"backend": "file", "reads": self.reads, "writes": self.writes}
+
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS spotify_tokens (
+    user_id TEXT PRIMARY KEY,
+    token_info TEXT NOT NULL,
+    expires_at BIGINT NOT NULL,
+    updated_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+
+class SQLiteTokenStore:
+    """Tokens in a local SQLite database, shared safely by several worker processes."""
+
+    def __init__(self, path=TOKEN_STORE_PATH):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def _connect(self):
+        if self._connection is None:
+            # Autocommit, and WAL so readers in other workers never block on a writer
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                               timeout=5.0)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_CREATE_TABLE)
+        return self._connection
+
+    def get(self, user_id):
+        with self._lock:
+            self.reads += 1
+            row = self._connect().execute(
+                "SELECT token_info FROM spotify_tokens WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, user_id, token_info):
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO spotify_tokens (user_id, token_info, expires_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET token_info = excluded.token_info, "
+                "expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+                (user_id, json.dumps(token_info), token_info.get("expires_at", 0), time.time()))
+            self.writes += 1
+
+    def put_many(self, tokens):
+        """Bulk insert {user_id: token_info} in one transaction, e.g. for seeding."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO spotify_tokens (user_id, token_info, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(user_id, json.dumps(info), info.get("expires_at", 0), time.time())
+                 for user_id, info in tokens.items()])
+            connection.execute("COMMIT")
+            self.writes += len(tokens)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._connect().execute("DELETE FROM spotify_tokens WHERE user_id = ?", (user_id,))
+
+    def open(self):
+        with self._lock:
+            self._connect()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        return {"backend": "sqlite", "reads": self.reads, "writes": self.writes}
+
+
+class PostgresTokenStore:
+    """Tokens in PostgreSQL through a psycopg2 ThreadedConnectionPool.
+
+    The pool is opened on first use and shared by the request threads of one
+    worker; every worker and node sees the same tokens.
+    """
+
+    def __init__(self, dsn=TOKEN_STORE_DSN, minconn=TOKEN_STORE_POOL_MIN, maxconn=TOKEN_STORE_POOL_MAX):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self._pool_class = ThreadedConnectionPool
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = None
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._pool_class(self.minconn, self.maxconn, self.dsn)
+                with self._connection(self._pool) as cursor:
+                    cursor.execute(_CREATE_TABLE.replace("token_info TEXT", "token_info JSONB"))
+            return self._pool
+
+    @contextmanager
+    def _connection(self, pool=None):
+        pool = pool or self._get_pool()
+        connection = pool.getconn()
+        try:
+            with connection, connection.cursor() as cursor:
+                yield cursor
+        finally:
+            pool.putconn(connection)
+
+    def get(self, user_id):
+        self.reads += 1
+        with self._connection() as cursor:
+            cursor.execute("SELECT token_info FROM spotify_tokens WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def put(self, user_id, token_info):
+        with self._connection() as cursor:
+            cursor.execute(
+                "INSERT INTO spotify_tokens (user_id, token_info, expires_at, updated_at) "
+                "VALUES (%s, %s::jsonb, %s, %s) "
+                "ON CONFLICT (user_id) DO UPDATE SET token_info = EXCLUDED.token_info, "
+                "expires_at = EXCLUDED.expires_at, updated_at = EXCLUDED.updated_at",
+                (user_id, json.dumps(token_info), token_info.get("expires_at", 0), time.time()))
+        self.writes += 1
+
+    def delete(self, user_id):
+        with self._connection() as cursor:
+            cursor.execute("DELETE FROM spotify_tokens WHERE user_id = %s", (user_id,))
+
+    def open(self):
+        self._get_pool()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def stats(self):
+        return {"backend": "postgres", "reads": self.reads, "writes": self.writes}
+
+
+def create_token_store(backend=TOKEN_STORE_BACKEND):
+    if backend == "postgres":
+        # No fallback: nodes on local SQLite would each see different tokens
+        try:
+            return PostgresTokenStore()
+        except ImportError as e:
+            raise RuntimeError("TOKEN_STORE_BACKEND=postgres needs psycopg2 (pip install psycopg2-binary)") from e
+    if backend == "sqlite":
+        return SQLiteTokenStore()
+    return FileTokenStore()
@@ -0,0 +1,304 @@
+# track_index.py
+import os
+import re
+import mmap
+import struct
+import zlib
+import logging
+import unicodedata
+import numpy as np
+from app.services.metrics import register_cache
+
+TRACK_INDEX_PATH = os.getenv("TRACK_INDEX_PATH", "track_index.bin")
+# Below this score a local match isn't trusted and we fall back to Spotify search
+TRACK_INDEX_MIN_SCORE = float(os.getenv("TRACK_INDEX_MIN_SCORE", "0.75"))
+# The score alone lets "love" match "Love Story": the query must also cover
+# this share of the track title's grams...
+TRACK_INDEX_MIN_TITLE_COVERAGE = float(os.getenv("TRACK_INDEX_MIN_TITLE_COVERAGE", "0.6"))
+# ...and a spoken artist must mostly be found in the track's artist
+TRACK_INDEX_MIN_ARTIST_MATCH = float(os.getenv("TRACK_INDEX_MIN_ARTIST_MATCH", "0.5"))
+# Best-scoring candidates checked for coverage before giving up
+_VERIFY_CANDIDATES = 8
+
+# Posting lists longer than total // _COMMON_GRAM_DIVISOR (and at least
+# _MIN_COMMON_POSTINGS) are treated as common grams at lookup time
+_COMMON_GRAM_DIVISOR = 1000
+_MIN_COMMON_POSTINGS = 64
+_MAGIC = b"TRKIDX01"
+_HEADER = struct.Struct("<8sIIII")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+_SOUNDEX = str.maketrans("bfpvcgjkqsxzdtlmnr", "111122222222334556", "aeiouyhw")
+
+
+def normalize(text):
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    text = _SPACES.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+    # A leading "the" is often dropped or misheard
+    return text[4:] if text.startswith("the ") else text
+
+
+def soundex(word):
+    if not word.isalpha():
+        return word
+    digits = word[1:].translate(_SOUNDEX)
+    code = []
+    for digit in digits:
+        if not code or code[-1] != digit:
+            code.append(digit)
+    return (word[0] + "".join(code) + "000")[:4]
+
+
+def text_grams(text):
+    """Whole words, character trigrams and a soundex code per word."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        grams.add("#" + soundex(word))
+        grams.add("=" + word)
+    return grams
+
+
+def track_grams(name, artist=None):
+    grams = text_grams(name)
+    # Artist grams are namespaced so a title word never matches an artist word
+    grams.update("@" + gram for gram in text_grams(artist))
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint32, count=len(grams))
+
+
+class TrackIndex:
+    """Fuzzy n-gram/phonetic index over known tracks for resolving spoken titles.
+
+    The base index is a compact file that is memory-mapped at load. Tracks
+    added at runtime (library syncs, resolved searches) go into an in-memory
+    delta that is merged into the file on save().
+    """
+
+    def __init__(self, path=TRACK_INDEX_PATH, min_score=TRACK_INDEX_MIN_SCORE,
+                 min_title_coverage=TRACK_INDEX_MIN_TITLE_COVERAGE, min_artist_match=TRACK_INDEX_MIN_ARTIST_MATCH):
+        self.path = path
+        self.min_score = min_score
+        self.min_title_coverage = min_title_coverage
+        self.min_artist_match = min_artist_match
+        self._mmap = None
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self):
+        # Drop every view onto the mmap first; it can't be closed while they exist
+        self._base_count = 0
+        self._gram_ids = np.zeros(0, dtype=np.uint32)
+        self._gram_offsets = np.zeros(1, dtype=np.uint32)
+        self._postings = np.zeros(0, dtype=np.uint32)
+        self._base_gram_counts = np.zeros(0, dtype=np.uint16)
+        self._string_offsets = np.zeros(1, dtype=np.uint32)
+        self._strings = b""
+        self._delta_tracks = []
+        self._delta_postings = {}
+        self._delta_gram_counts = []
+        self._gram_counts = None
+        self._uris = {}
+        self.dirty = False
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __len__(self):
+        return self._base_count + len(self._delta_tracks)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, tracks, grams, postings, strings = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            logging.error("Not a track index, ignoring it", extra={"path": self.path})
+            self._mmap.close()
+            self._mmap = None
+            return self
+
+        offset = _HEADER.size
+
+        def view(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self._base_count = tracks
+        self._gram_ids = view(np.uint32, grams)
+        self._gram_offsets = view(np.uint32, grams + 1)
+        self._postings = view(np.uint32, postings)
+        self._string_offsets = view(np.uint32, tracks + 1)
+        self._base_gram_counts = view(np.uint16, tracks)
+        self._strings = memoryview(self._mmap)[offset:offset + strings]
+        self._gram_counts = None
+        self._uris = None
+        logging.info("Loaded track index", extra={"tracks": tracks, "path": self.path})
+        return self
+
+    def _track(self, track_id):
+        if track_id >= self._base_count:
+            return self._delta_tracks[track_id - self._base_count]
+        start, end = self._string_offsets[track_id], self._string_offsets[track_id + 1]
+        uri, name, artist = bytes(self._strings[start:end]).decode().split("\t")
+        return uri, name, artist
+
+    def add(self, uri, name, artist=None):
+        if self._uris is None:
+            # Built on first add so loading the index stays a cheap mmap
+            self._uris = {self._track(i)[0]: i for i in range(self._base_count)}
+        if not uri or uri in self._uris:
+            return
+        track_id = len(self)
+        self._delta_tracks.append((uri, name, artist or ""))
+        grams = track_grams(name, artist)
+        for gram in grams.tolist():
+            self._delta_postings.setdefault(gram, []).append(track_id)
+        self._delta_gram_counts.append(len(grams))
+        self._uris[uri] = track_id
+        self._gram_counts = None
+        self.dirty = True
+
+    def add_spotify_track(self, track):
+        artists = track.get("artists") or [{}]
+        self.add(track.get("uri"), track.get("name", ""), artists[0].get("name"))
+
+    def _all_gram_counts(self):
+        if self._gram_counts is None:
+            self._gram_counts = np.concatenate(
+                [self._base_gram_counts, np.asarray(self._delta_gram_counts, dtype=np.uint16)]
+            ).astype(np.float32)
+        return self._gram_counts
+
+    def lookup(self, song_name, artist_name=None):
+        """Return (track dict, score) for the best local match, or None."""
+        total = len(self)
+        if total == 0:
+            self.misses += 1
+            return None
+        query = np.unique(track_grams(song_name, artist_name))
+        if query.size == 0:
+            self.misses += 1
+            return None
+
+        matched = []
+        if self._gram_ids.size:
+            slots = np.minimum(np.searchsorted(self._gram_ids, query), self._gram_ids.size - 1)
+            for slot in slots[self._gram_ids[slots] == query].tolist():
+                matched.append(self._postings[self._gram_offsets[slot]:self._gram_offsets[slot + 1]])
+        for gram in query.tolist():
+            postings = self._delta_postings.get(gram)
+            if postings:
+                matched.append(np.asarray(postings, dtype=np.uint32))
+        if not matched:
+            self.misses += 1
+            return None
+
+        # Candidates come from the rarer grams only; for the common grams we
+        # just test membership of those candidates, which is far cheaper
+        # than merging long posting lists. Posting lists are sorted by id.
+        cutoff = max(_MIN_COMMON_POSTINGS, total // _COMMON_GRAM_DIVISOR)
+        rare = [postings for postings in matched if postings.size <= cutoff]
+        common = [postings for postings in matched if postings.size > cutoff]
+        if not rare:
+            rare, common = matched, []
+        candidates, shared = np.unique(np.concatenate(rare), return_counts=True)
+        for postings in common:
+            found = np.minimum(np.searchsorted(postings, candidates), postings.size - 1)
+            shared += postings[found] == candidates
+        shared = shared.astype(np.float32)
+        # How much of what was said is in the track, with a Dice term so a
+        # short exact title beats a longer one that merely contains it
+        containment = shared / query.size
+        dice = 2 * shared / (query.size + self._all_gram_counts()[candidates])
+        scores = 0.7 * containment + 0.3 * dice
+
+        title_grams, artist_grams = text_grams(song_name), text_grams(artist_name)
+        for best in np.argsort(-scores, kind="stable")[:_VERIFY_CANDIDATES].tolist():
+            score = float(scores[best])
+            if score < self.min_score:
+                break
+            uri, name, artist = self._track(int(candidates[best]))
+            if self._covers(title_grams, artist_grams, name, artist):
+                self.hits += 1
+                return {"uri": uri, "name": name, "artists": [{"name": artist}]}, score
+        self.misses += 1
+        return None
+
+    def _covers(self, title_grams, artist_grams, name, artist):
+        """Whether the query names this track's whole title and, if given, its artist."""
+        track_title = text_grams(name)
+        if not track_title or len(title_grams & track_title) / len(track_title) < self.min_title_coverage:
+            return False
+        if artist_grams:
+            return len(artist_grams & text_grams(artist)) / len(artist_grams) >= self.min_artist_match
+        return True
+
+    def save(self, path=None):
+        """Write base and delta tracks to one compact file, replacing it atomically."""
+        path = path or self.path
+        tracks = [self._track(i) for i in range(len(self))]
+        postings_by_gram = {}
+        gram_counts = np.zeros(len(tracks), dtype=np.uint16)
+        for track_id, (_, name, artist) in enumerate(tracks):
+            grams = track_grams(name, artist)
+            gram_counts[track_id] = min(len(grams), 0xFFFF)
+            for gram in grams.tolist():
+                postings_by_gram.setdefault(gram, []).append(track_id)
+
+        gram_ids = np.array(sorted(postings_by_gram), dtype=np.uint32)
+        lengths = np.array([len(postings_by_gram[g]) for g in gram_ids.tolist()], dtype=np.uint32)
+        gram_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.uint32)
+        postings = np.fromiter((t for g in gram_ids.tolist() for t in postings_by_gram[g]),
+                               dtype=np.uint32, count=int(gram_offsets[-1]))
+        encoded = [f"{uri}\t{name}\t{artist}".encode() for uri, name, artist in tracks]
+        string_offsets = np.concatenate([[0], np.cumsum([len(e) for e in encoded])]).astype(np.uint32)
+        strings = b"".join(encoded)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as index_file:
+            index_file.write(_HEADER.pack(_MAGIC, len(tracks), gram_ids.size, postings.size, len(strings)))
+            for array in (gram_ids, gram_offsets, postings, string_offsets, gram_counts):
+                index_file.write(array.tobytes())
+            index_file.write(strings)
+        self._reset()
+        os.replace(tmp_path, path)
+        self.path = path
+        self.load()
+
+    def close(self):
+        if self.dirty:
+            self.save()
+        self._reset()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"tracks": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+async def sync_from_spotify(index, sp, max_tracks=2000):
+    """Add the user's saved tracks and recently played tracks to the index."""
+    offset = 0
+    while offset < max_tracks:
+        page = await sp.saved_tracks(limit=50, offset=offset)
+        items = (page or {}).get("items", [])
+        for item in items:
+            index.add_spotify_track(item["track"])
+        if len(items) < 50:
+            break
+        offset += 50
+    recent = await sp.recently_played(limit=50)
+    for item in (recent or {}).get("items", []):
+        index.add_spotify_track(item["track"])
+    logging.info("Track index synced", extra={"tracks": len(index)})
+
+
+track_index = TrackIndex()
+register_cache("track_index", track_index.stats)
@@ -0,0 +1,66 @@
+# user_session.py
+import os
+import secrets
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+from fastapi.responses import JSONResponse
+
+# With MULTI_USER off every request acts for the single default user, as before
+MULTI_USER = os.getenv("MULTI_USER", "0") == "1"
+SESSION_COOKIE = "session_id"
+SESSION_HEADER = b"x-session-id"
+DEFAULT_USER = "default"
+# Reachable without a session when MULTI_USER is on; everything else gets a 401
+PUBLIC_PATHS = {"/", "/login", "/callback", "/health", "/metrics", "/docs", "/openapi.json"}
+
+current_user = ContextVar("current_user", default=DEFAULT_USER)
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+def session_from_scope(scope):
+    """The session id from the X-Session-Id header or the session cookie, if any."""
+    for name, value in scope.get("headers", ()):
+        if name == SESSION_HEADER:
+            return value.decode("latin-1")
+        if name == b"cookie":
+            morsel = SimpleCookie(value.decode("latin-1")).get(SESSION_COOKIE)
+            if morsel is not None:
+                return morsel.value
+    return None
+
+
+class UserSessionMiddleware:
+    """Sets current_user for each HTTP or WebSocket request.
+
+    Code that needs the caller's Spotify token reads current_user instead
+    of having the session threaded through every call; tasks started by the
+    request inherit it. With MULTI_USER on, a request without a session is
+    turned away rather than acting as the default user.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        session_id = session_from_scope(scope) if MULTI_USER else None
+        if MULTI_USER and session_id is None and scope["path"] not in PUBLIC_PATHS:
+            await self._reject(scope, receive, send)
+            return
+        token = current_user.set(session_id or DEFAULT_USER)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_user.reset(token)
+
+    async def _reject(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        response = JSONResponse({"detail": "Session required, log in at /login"}, status_code=401)
+        await response(scope, receive, send)
@@ -1,33 +1,177 @@
-import speech_recognition as sr
+import os
+import time
+import hashlib
 import logging
+import threading
 from io import BytesIO
+from collections import OrderedDict
+from app.services.audio_preprocess import preprocess_audio, AUDIO_PREPROCESS, TARGET_SAMPLE_RATE
+from app.services.metrics import register_cache
 
-# Initialize the logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-def recognize_speech(audio_data):
-    recognizer = sr.Recognizer()
+# Which engine recognizes speech: "google", "sphinx" (fully local) or "stub"
+RECOGNIZER_BACKEND = os.getenv("RECOGNIZER_BACKEND", "google")
+RECOGNITION_CACHE_SIZE = int(os.getenv("RECOGNITION_CACHE_SIZE", "256"))
+STUB_RECOGNIZER_TEXT = os.getenv("STUB_RECOGNIZER_TEXT", "play test song by test artist")
+# Audio is normalized to this format before hashing, so the same clip
+# re-encoded at another rate or width still hits the cache
+CACHE_SAMPLE_RATE = 16000
+CACHE_SAMPLE_WIDTH = 2
+
+
+_local = threading.local()
+
+
+def _speech_recognition():
+    # Imported on first use (or by warm_up) so importing the app stays fast
+    import speech_recognition
+    return speech_recognition
+
+
+def get_recognizer():
+    """This thread's Recognizer, built once per recognition worker."""
+    recognizer = getattr(_local, "recognizer", None)
+    if recognizer is None:
+        recognizer = _local.recognizer = _speech_recognition().Recognizer()
+    return recognizer
+
+
+def warm_up(hold_seconds=0.0):
+    """Import the recognizer and build this worker's instance ahead of the first request."""
+    get_recognizer()
+    # Holding the worker briefly makes concurrent warm-up calls land on different workers
+    time.sleep(hold_seconds)
+    return get_backend()[0]
+
+
+def _recognize_google(recognizer, audio):
+    return recognizer.recognize_google(audio)
+
+
+def _recognize_sphinx(recognizer, audio):
+    # Runs locally with pocketsphinx, no network hop
+    return recognizer.recognize_sphinx(audio)
+
+
+def _recognize_stub(recognizer, audio):
+    # Deterministic stand-in for tests and load tests
+    return STUB_RECOGNIZER_TEXT
+
+
+_BACKENDS = {
+    "google": _recognize_google,
+    "sphinx": _recognize_sphinx,
+    "stub": _recognize_stub,
+}
+
+
+def register_backend(name, recognize):
+    """Add a recognizer engine; `recognize(recognizer, audio_data)` returns the text."""
+    _BACKENDS[name] = recognize
+
+
+def get_backend(name=None):
+    name = name or RECOGNIZER_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown recognizer backend '{name}', expected one of {sorted(_BACKENDS)}")
+    return name, _BACKENDS[name]
+
+
+class RecognitionCache:
+    """Small thread-safe LRU of recognized text keyed by a hash of the PCM."""
+
+    def __init__(self, maxsize=RECOGNITION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def set(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+recognition_cache = RecognitionCache()
+register_cache("recognition", recognition_cache.stats)
+
+
+def audio_fingerprint(audio, backend_name):
+    pcm = audio.get_raw_data(convert_rate=CACHE_SAMPLE_RATE, convert_width=CACHE_SAMPLE_WIDTH)
+    return hashlib.sha256(backend_name.encode() + b"\0" + pcm).hexdigest()
+
+
+def recognize(audio_data, max_seconds=None, backend=None):
+    """Recognize speech and report which backend served it and how long it took.
+
+    Returns a dict with "text", "backend", "elapsed_ms" and "cached". On
+    failure "text" holds the error message, as recognize_speech always has.
+    """
+    sr = _speech_recognition()
+    recognizer = get_recognizer()
+    backend_name, engine = get_backend(backend)
+    start = time.perf_counter()
+
+    def result(text, cached=False):
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        return {"text": text, "backend": backend_name, "elapsed_ms": elapsed_ms, "cached": cached}
 
     try:
-        # Convert raw audio data (bytes) into a file-like object using BytesIO
-        audio_file = BytesIO(audio_data)
-        
-        # Use sr.AudioFile for better handling of various formats
-        with sr.AudioFile(audio_file) as source:
-            recognizer.adjust_for_ambient_noise(source)  # Adjust for background noise
-            audio_data = recognizer.record(source)  # Record the audio from the file
-
-        text = recognizer.recognize_google(audio_data)
-        logger.info(f"Recognized text: {text}")
-        return text
+        # Accept an already open file (e.g. the spooled upload) or raw bytes
+        audio_file = audio_data if hasattr(audio_data, "read") else BytesIO(audio_data)
+
+        prepared = preprocess_audio(audio_file, max_seconds) if AUDIO_PREPROCESS else None
+        if prepared is not None:
+            pcm, preprocess_stats = prepared
+            if not pcm:
+                raise sr.UnknownValueError()
+            logger.info("Preprocessed audio", extra=preprocess_stats)
+            audio_data = sr.AudioData(pcm, TARGET_SAMPLE_RATE, 2)
+        else:
+            # Use sr.AudioFile for better handling of various formats
+            with sr.AudioFile(audio_file) as source:
+                audio_data = recognizer.record(source, duration=max_seconds)  # Record the audio from the file
+
+        key = audio_fingerprint(audio_data, backend_name)
+        text = recognition_cache.get(key)
+        if text is not None:
+            logger.info("Recognized text", extra={"backend": backend_name, "cached": True, "text": text})
+            return result(text, cached=True)
+
+        text = engine(recognizer, audio_data)
+        recognition_cache.set(key, text)
+        logger.info("Recognized text", extra={"backend": backend_name, "cached": False, "text": text})
+        return result(text)
 
     except sr.UnknownValueError:
         logger.warning("Speech recognition could not understand the audio")
-        return "Speech recognition could not understand the audio"
+        return result("Speech recognition could not understand the audio")
     except sr.RequestError as e:
-        logger.error(f"Could not request results from speech recognition service; {e}")
-        return f"Could not request results from speech recognition service; {e}"
+        logger.error("Could not request results from speech recognition service", extra={"error": str(e)})
+        return result(f"Could not request results from speech recognition service; {e}")
     except Exception as e:
-        logger.error(f"An unexpected error occurred: {str(e)}")
-        return f"Error processing the audio: {str(e)}"
+        logger.error("An unexpected error occurred", extra={"error": str(e)})
+        return result(f"Error processing the audio: {str(e)}")
+
+
+def recognize_speech(audio_data, max_seconds=None, backend=None):
+    return recognize(audio_data, max_seconds=max_seconds, backend=backend)["text"]
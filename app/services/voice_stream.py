@@ -0,0 +1,174 @@
+# voice_stream.py
+import io
+import os
+import wave
+import asyncio
+import logging
+from app.services.command_parser import parse_command, execute_command, COMMAND_HANDLERS
+from app.services.play_pipeline import prepare_track, play_prepared, describe_play_result
+from app.services.recognition_pool import recognition_pool, RecognitionPoolFull, RecognitionTimeout
+from app.services.search_cache import make_key
+from app.services.spotify_client import spotify_client
+from app.services.timing import StageTimer
+
+# Seconds of newly received audio between two partial recognitions
+STREAM_PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", "0.75"))
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "30"))
+SAMPLE_WIDTHS = (1, 2, 4)
+
+
+def pcm_to_wav(pcm, sample_rate, channels, sample_width):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    buffer.seek(0)
+    return buffer
+
+
+def _retrieve_exception(task):
+    # Background tasks nobody awaits (a cancelled-too-late speculation, a
+    # partial recognition) may have failed; retrieve the error so asyncio
+    # doesn't log "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class VoiceStreamSession:
+    """One streamed voice command: raw PCM frames in, a command result out.
+
+    While audio arrives, the buffer is re-recognized every
+    STREAM_PARTIAL_INTERVAL seconds of new audio. As soon as a partial
+    transcript parses as a play intent, the track search and device lookup
+    start speculatively; the final transcript then either reuses that work
+    or cancels it and starts over.
+    """
+
+    def __init__(self, access_token, sample_rate=16000, channels=1, sample_width=2, notify=None):
+        if sample_rate <= 0:
+            raise ValueError("sample_rate must be positive")
+        if channels < 1:
+            raise ValueError("channels must be at least 1")
+        if sample_width not in SAMPLE_WIDTHS:
+            raise ValueError(f"sample_width must be one of {SAMPLE_WIDTHS}")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.bytes_per_second = sample_rate * channels * sample_width
+        self.notify = notify
+        self.sp = spotify_client.for_token(access_token) if access_token else None
+        self.pcm = bytearray()
+        self._last_partial_size = 0
+        self._partial_task = None
+        self._speculation = None
+
+    def feed(self, chunk):
+        if len(self.pcm) + len(chunk) > STREAM_MAX_SECONDS * self.bytes_per_second:
+            raise ValueError(f"Audio exceeds {STREAM_MAX_SECONDS:g} seconds")
+        self.pcm.extend(chunk)
+        # Only one partial recognition at a time; frames keep arriving meanwhile
+        busy = self._partial_task is not None and not self._partial_task.done()
+        fresh_bytes = len(self.pcm) - self._last_partial_size
+        if not busy and fresh_bytes >= STREAM_PARTIAL_INTERVAL * self.bytes_per_second:
+            self._last_partial_size = len(self.pcm)
+            self._partial_task = asyncio.create_task(self._recognize_partial(bytes(self.pcm)))
+            self._partial_task.add_done_callback(_retrieve_exception)
+
+    async def _send(self, message):
+        if self.notify is not None:
+            await self.notify(message)
+
+    async def _recognize(self, pcm):
+        audio = pcm_to_wav(pcm, self.sample_rate, self.channels, self.sample_width)
+        return await recognition_pool.submit(audio)
+
+    async def _recognize_partial(self, pcm):
+        try:
+            result = await self._recognize(pcm)
+        except (RecognitionPoolFull, RecognitionTimeout):
+            # Partials are best effort; the final recognition still runs
+            return
+        command = parse_command(result["text"])
+        await self._send({"event": "partial", "text": result["text"]})
+        if command.get("action") == "play":
+            await self._speculate(command)
+
+    async def _speculate(self, command):
+        if self.sp is None:
+            return
+        key = make_key(command["song_name"], command.get("artist_name"))
+        if self._speculation is not None and self._speculation[0] == key:
+            return
+        self._cancel_speculation()
+        timer = StageTimer()
+        task = asyncio.create_task(prepare_track(self.sp, command["song_name"], command.get("artist_name"),
+                                                 timer, command.get("alternatives")))
+        task.add_done_callback(_retrieve_exception)
+        self._speculation = (key, task, timer)
+        logging.info("Speculatively resolving track", extra={"key": key})
+        await self._send({"event": "speculating", "song_name": command["song_name"],
+                          "artist_name": command.get("artist_name")})
+
+    def _cancel_speculation(self):
+        if self._speculation is not None:
+            self._speculation[1].cancel()
+            self._speculation = None
+
+    async def _play(self, command, timer):
+        key = make_key(command["song_name"], command.get("artist_name"))
+        outcome = "none"
+        prepared = None
+        if self._speculation is not None:
+            speculated_key, task, speculative_timer = self._speculation
+            self._speculation = None
+            if speculated_key == key:
+                try:
+                    with timer.stage("speculation_wait"):
+                        prepared = await task
+                    outcome = "hit"
+                    timer.timings["speculative"] = speculative_timer.timings
+                except Exception as e:
+                    logging.warning("Speculative lookup failed, retrying", extra={"error": str(e)})
+                    outcome = "failed"
+            else:
+                task.cancel()
+                outcome = "miss"
+        if prepared is None:
+            prepared = await prepare_track(self.sp, command["song_name"], command.get("artist_name"),
+                                           timer, command.get("alternatives"))
+        result = await play_prepared(self.sp, prepared[0], prepared[1], timer)
+        return describe_play_result(result), outcome
+
+    async def finish(self):
+        """Recognize the whole utterance and run the command; returns the final message."""
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+        timer = StageTimer()
+        with timer.stage("recognition"):
+            recognition = await self._recognize(bytes(self.pcm))
+        recognized_text = recognition.pop("text")
+        with timer.stage("parse"):
+            command = parse_command(recognized_text)
+
+        speculation = "none"
+        if command.get("action") == "play":
+            if self.sp is None:
+                response = "Spotify authentication required"
+            else:
+                response, speculation = await self._play(command, timer)
+        elif command.get("action") in COMMAND_HANDLERS:
+            with timer.stage("execute"):
+                response = await execute_command(command)
+        else:
+            response = command
+        self._cancel_speculation()
+
+        return {"event": "final", "recognized_text": recognized_text, "response": response,
+                "recognition": recognition, "speculation": speculation, "timings": timer.total()}
+
+    def cancel(self):
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+        self._cancel_speculation()
@@ -0,0 +1,104 @@
+"""Peak memory of concurrent /voice-command uploads, before and after streaming ingestion.
+
+    python -m benchmarks.bench_audio_ingest --uploads 16 --seconds 30
+
+Each mode runs in its own subprocess so ru_maxrss is a clean high-water mark.
+Uploads are 44.1 kHz stereo WAVs held in SpooledTemporaryFiles, the way
+Starlette hands them to the endpoint. Both modes end with the recognizer's
+own read of the frames, which neither path can avoid.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import wave
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+
+class SpooledUpload:
+    """Minimal stand-in for starlette's UploadFile."""
+
+    def __init__(self, file):
+        self.file = file
+        self.size = None
+
+    async def read(self, size=-1):
+        return self.file.read(size)
+
+
+def make_upload(seconds, sample_rate=44100, channels=2):
+    spool = SpooledTemporaryFile(max_size=1024 * 1024)
+    with wave.open(spool, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        frame = b"\x01\x00" * channels
+        for _ in range(seconds):
+            wav_file.writeframes(frame * sample_rate)
+    spool.seek(0)
+    return SpooledUpload(spool)
+
+
+async def buffered(upload):
+    # Old path: read everything, wrap it in BytesIO, then let the recognizer copy it again
+    data = await upload.read()
+    audio_file = BytesIO(data)
+    with wave.open(audio_file, "rb") as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+    await asyncio.sleep(0.2)  # recognition in flight, buffers still referenced
+    return len(data) + len(frames)
+
+
+async def streamed(upload, max_seconds):
+    from app.services.audio_ingest import read_audio_upload
+
+    audio_file, _ = await read_audio_upload(upload, max_seconds=max_seconds)
+    with wave.open(audio_file, "rb") as wav_file:
+        frames = wav_file.readframes(wav_file.getnframes())
+    await asyncio.sleep(0.2)
+    return len(frames)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_mode(mode, uploads, seconds):
+    files = [make_upload(seconds) for _ in range(uploads)]
+    baseline = peak_rss_mb()
+    if mode == "before":
+        await asyncio.gather(*(buffered(upload) for upload in files))
+    else:
+        await asyncio.gather(*(streamed(upload, seconds + 1) for upload in files))
+    return {"mode": mode, "uploads": uploads, "seconds": seconds,
+            "baseline_rss_mb": round(baseline, 1), "peak_rss_mb": round(peak_rss_mb(), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--mode", choices=["before", "after"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args.mode, args.uploads, args.seconds))))
+        return
+
+    results = {}
+    for mode in ("before", "after"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_audio_ingest", "--mode", mode,
+             "--uploads", str(args.uploads), "--seconds", str(args.seconds)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
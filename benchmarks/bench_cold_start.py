@@ -0,0 +1,129 @@
+"""Cold start: import time of app.main and latency of the first requests.
+
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --before-ref HEAD~1
+
+For each tree (the working tree, and --before-ref exported with `git
+archive` for comparison) this reports:
+  import_ms          `python -X importtime -c "import app.main"`, cumulative
+                     time of app.main (median of --runs)
+  modules            how many modules that import pulls in
+  listening_ms       process spawn until the server answers at all
+  ready_ms           process spawn until /health returns 200
+  first_request_ms   first /voice-command after ready, then the second one
+
+The app runs under uvicorn in a temp directory with the stub recognizer,
+a token file and the local mock Spotify server, so nothing leaves the
+machine. Spawn times include the interpreter start-up itself.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.mock_spotify import MockSpotifyServer, free_port
+from benchmarks.ws_voice_harness import make_speech_wav
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def export_tree(ref, target):
+    archive = subprocess.run(["git", "-C", ROOT, "archive", ref], check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", target], input=archive, check=True)
+    return target
+
+
+def import_time(home, env, runs):
+    totals = []
+    modules = 0
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=home,
+                                env=env, capture_output=True, text=True, check=True)
+        lines = [line for line in result.stderr.splitlines() if line.startswith("import time:")]
+        for line in lines:
+            _, cumulative, name = line.split("|")
+            if name.strip() == "app.main":
+                totals.append(int(cumulative) / 1000)
+        modules = len(lines) - 1
+    return round(statistics.median(totals), 1), modules
+
+
+def start_and_probe(home, env, wav, port):
+    spawned = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=home, env=env)
+    results = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            deadline = spawned + 60
+            while time.perf_counter() < deadline:
+                try:
+                    status = client.get("/health").status_code
+                except httpx.TransportError:
+                    time.sleep(0.005)
+                    continue
+                results.setdefault("listening_ms", round((time.perf_counter() - spawned) * 1000, 1))
+                if status == 200:
+                    results["ready_ms"] = round((time.perf_counter() - spawned) * 1000, 1)
+                    break
+                time.sleep(0.005)
+            else:
+                raise RuntimeError("app did not become ready")
+            latencies = []
+            for _ in range(2):
+                start = time.perf_counter()
+                response = client.post("/voice-command", params={"wait": True},
+                                       files={"audio": ("clip.wav", wav, "audio/wav")})
+                latencies.append(round((time.perf_counter() - start) * 1000, 1))
+                results["first_request_status"] = results.get("first_request_status", response.status_code)
+            results["first_request_ms"], results["second_request_ms"] = latencies
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def measure(tree, server, wav, runs):
+    with tempfile.TemporaryDirectory() as home:
+        expires_at = int(time.time()) + 3600
+        with open(os.path.join(home, "token_info.json"), "w") as token_file:
+            json.dump({"access_token": "bench", "refresh_token": "bench", "token_type": "Bearer",
+                       "expires_in": 3600, "expires_at": expires_at}, token_file)
+        env = {**os.environ, "PYTHONPATH": tree, "RECOGNIZER_BACKEND": "stub",
+               "SPOTIFY_API_BASE_URL": server.base_url, "SPOTIFY_RATE_LIMIT": "0", "LOG_LEVEL": "WARNING",
+               "TRACK_INDEX_PATH": os.path.join(home, "track_index.bin"), "SPOTIPY_CLIENT_ID": "bench",
+               "SPOTIPY_CLIENT_SECRET": "bench", "SPOTIPY_REDIRECT_URI": "http://127.0.0.1/callback",
+               "PLAYBACK_DEBOUNCE_MS": "0"}
+        import_ms, modules = import_time(home, env, runs)
+        results = {"import_ms": import_ms, "modules": modules}
+        starts = [start_and_probe(home, env, wav, free_port()) for _ in range(runs)]
+        for key in starts[0]:
+            values = [start[key] for start in starts]
+            results[key] = statistics.median(values) if key.endswith("_ms") else values[0]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before-ref", help="git ref to compare against, e.g. HEAD~1")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    wav = make_speech_wav(2, 0.3)
+    results = {}
+    with MockSpotifyServer(latency_ms=5) as server:
+        if args.before_ref:
+            with tempfile.TemporaryDirectory() as before:
+                results["before"] = measure(export_tree(args.before_ref, before), server, wav, args.runs)
+        results["after"] = measure(ROOT, server, wav, args.runs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Correctness checks and a throughput microbenchmark for parse_command.
+
+    python -m benchmarks.bench_command_parser --utterances 100000
+
+The ambiguous "by" cases are checked first; the run fails if any of them
+parse wrongly. Throughput is measured on one core over a mix of intents.
+"""
+import argparse
+import json
+import time
+
+from app.services.command_parser import parse_command
+
+CASES = [
+    ("play stand by me by ben e king", {"song_name": "stand by me", "artist_name": "ben e king"}),
+    ("play by the way by red hot chili peppers", {"song_name": "by the way", "artist_name": "red hot chili peppers"}),
+    ("play by the way", {"song_name": "by the way", "artist_name": None}),
+    ("play baby by justin bieber", {"song_name": "baby", "artist_name": "justin bieber"}),
+    ("play baby", {"song_name": "baby", "artist_name": None}),
+    ("play lullaby", {"song_name": "lullaby", "artist_name": None}),
+    ("play goodbye yellow brick road by elton john", {"song_name": "goodbye yellow brick road", "artist_name": "elton john"}),
+    ("Play Shape of You by Ed Sheeran.", {"song_name": "shape of you", "artist_name": "ed sheeran"}),
+    ("play  hey jude   by the beatles", {"song_name": "hey jude", "artist_name": "the beatles"}),
+    ("play bye bye bye by nsync", {"song_name": "bye bye bye", "artist_name": "nsync"}),
+    ("play stand by me", {"song_name": "stand", "artist_name": "me",
+                          "alternatives": [{"song_name": "stand by me", "artist_name": None}]}),
+    ("queue stand by me by ben e king to the queue", {"action": "queue", "song_name": "stand by me",
+                                                      "artist_name": "ben e king"}),
+    ("play", {"action": "resume"}),
+    ("pause the music", {"action": "pause"}),
+    ("skip this song", {"action": "skip"}),
+    ("play the next track", {"action": "skip"}),
+    ("set the volume to 35 percent", {"action": "volume", "volume_level": 35}),
+    ("volume 250", {"action": "volume", "volume_level": 100}),
+    ("turn it up", {"action": "volume_up"}),
+    ("turn the volume down", {"action": "volume_down"}),
+    ("what's the weather", {"error": "Command not recognized"}),
+]
+
+MIX = [
+    "play blinding lights by the weeknd",
+    "Play Stand by Me",
+    "pause",
+    "set volume to 60",
+    "skip",
+    "queue bohemian rhapsody by queen",
+    "turn it up",
+    "play baby",
+    "tell me a joke",
+    "play the next song",
+]
+
+
+def check_cases():
+    failures = []
+    for text, expected in CASES:
+        parsed = parse_command(text)
+        if any(parsed.get(key) != value for key, value in expected.items()):
+            failures.append({"text": text, "expected": expected, "parsed": parsed})
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=100000)
+    args = parser.parse_args()
+
+    failures = check_cases()
+    if failures:
+        print(json.dumps(failures, indent=2))
+        raise SystemExit(f"{len(failures)} of {len(CASES)} grammar cases failed")
+
+    texts = (MIX * (args.utterances // len(MIX) + 1))[:args.utterances]
+    start = time.perf_counter()
+    for text in texts:
+        parse_command(text)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "cases_passed": len(CASES),
+        "utterances": len(texts),
+        "seconds": round(elapsed, 3),
+        "utterances_per_sec": round(len(texts) / elapsed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
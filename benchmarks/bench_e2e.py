@@ -0,0 +1,250 @@
+"""End-to-end benchmark of the real app against a mock Spotify and a stub recognizer.
+
+    python -m benchmarks.bench_e2e --requests 300 --concurrency 16
+    python -m benchmarks.bench_e2e --spotify-error-rate 0.02 --spotify-429-rate 0.05
+    python -m benchmarks.bench_e2e --output after.json --compare before.json
+
+Starts `uvicorn app.main:app` in its own process with the recognizer
+swapped for one that reads the transcript of a synthetic corpus clip
+(benchmarks/corpus.py) after --recognition-ms, and Spotify pointed at the
+local mock (benchmarks/mock_spotify.py) with the given latency and error
+rates. Each endpoint is then driven in turn at --concurrency:
+
+  voice_command    POST /voice-command with corpus clips, each clip once
+                   while --requests <= --clips, so recognition is uncached
+  spotify_search   GET /spotify-search with corpus song and artist queries
+  play_song        POST /play_song with a track URI
+
+Playback requests pass wait=true, with no debounce window, so each one is
+timed until Spotify has been called rather than until it is queued.
+
+The JSON report has throughput, status codes and latency percentiles per
+endpoint plus the commit it ran on. --output saves it, and --compare
+against an earlier report adds the relative change in throughput and
+p50/p99, so two commits can be compared with the same flags.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import corpus as corpus_module
+from benchmarks.load_spotify_client import percentile
+from benchmarks.mock_spotify import MockSpotifyServer, free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("voice_command", "spotify_search", "play_song")
+
+
+def serve(args):
+    """Run the app with the corpus recognizer; started by the benchmark in a child process."""
+    import uvicorn
+    from app.services import voice_recognition
+
+    clips = corpus_module.generate(args.clips, args.seed)
+    recognize = corpus_module.stub_recognizer(clips)
+    latency = args.recognition_ms / 1000
+
+    def slow_recognize(recognizer, audio):
+        time.sleep(latency)
+        return recognize(recognizer, audio)
+
+    voice_recognition.register_backend("corpus", slow_recognize)
+    voice_recognition.RECOGNIZER_BACKEND = "corpus"
+    from app.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_app(args, port, env, cwd, log_file):
+    command = [sys.executable, "-m", "benchmarks.bench_e2e", "--serve", "--port", str(port),
+               "--clips", str(args.clips), "--seed", str(args.seed), "--recognition-ms", str(args.recognition_ms)]
+    process = subprocess.Popen(command, env=env, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app exited during startup, see its log")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("app did not become ready")
+
+
+def make_requests(endpoint, clips, count, rng):
+    """(method, url, kwargs) for each request of one endpoint's run."""
+    if endpoint == "voice_command":
+        return [("POST", "/voice-command", {"params": {"wait": True},
+                                            "files": {"audio": ("clip.wav", clips[i % len(clips)]["wav"],
+                                                                "audio/wav")}})
+                for i in range(count)]
+    if endpoint == "spotify_search":
+        return [("GET", "/spotify-search", {"params": {"query": query}})
+                for query in corpus_module.search_queries(rng, count)]
+    return [("POST", "/play_song", {"params": {"access_token": "bench", "song_uri": f"spotify:track:bench{i % 50}",
+                                                 "wait": True}})
+            for i in range(count)]
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    codes = {}
+    for status in statuses:
+        codes[str(status)] = codes.get(str(status), 0) + 1
+    ok = sum(count for code, count in codes.items() if code.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "error_rate": round(1 - ok / len(latencies), 4),
+        "status_codes": codes,
+        "requests_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 2),
+            "p90": round(percentile(latencies_ms, 90), 2),
+            "p95": round(percentile(latencies_ms, 95), 2),
+            "p99": round(percentile(latencies_ms, 99), 2),
+            "max": round(max(latencies_ms), 2),
+            "mean": round(statistics.fmean(latencies_ms), 2),
+        },
+    }
+
+
+async def drive(port, requests, concurrency):
+    latencies = []
+    statuses = []
+    queue = iter(requests)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+
+        async def worker():
+            for method, url, kwargs in queue:
+                start = time.perf_counter()
+                try:
+                    status = (await client.request(method, url, **kwargs)).status_code
+                except httpx.TransportError:
+                    status = "transport_error"
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def git_revision():
+    def git(*command):
+        result = subprocess.run(["git", "-C", ROOT, *command], capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "app"))}
+
+
+def compare(results, baseline):
+    """Relative change from the baseline report, e.g. -0.1 is 10% lower."""
+    changes = {}
+    for endpoint, current in results.items():
+        before = baseline.get("results", {}).get(endpoint)
+        if not before:
+            continue
+
+        def change(new, old):
+            return round((new - old) / old, 4) if old else None
+
+        changes[endpoint] = {
+            "requests_per_sec": change(current["requests_per_sec"], before["requests_per_sec"]),
+            "p50": change(current["latency_ms"]["p50"], before["latency_ms"]["p50"]),
+            "p99": change(current["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+            "error_rate": round(current["error_rate"] - before["error_rate"], 4),
+        }
+    return {"baseline_commit": baseline.get("meta", {}).get("commit"), "changes": changes}
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    clips = corpus_module.generate(args.clips, args.seed)
+    report = {"meta": {**git_revision(), "python": platform.python_version(),
+                       "config": {key: value for key, value in vars(args).items()
+                                  if key not in ("serve", "port", "output", "compare")}}}
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms, rate_limit_rate=args.spotify_429_rate,
+                           retry_after=args.retry_after, error_rate=args.spotify_error_rate) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "token_info.json"), "w") as token_file:
+            json.dump({"access_token": "bench", "refresh_token": "bench", "token_type": "Bearer",
+                       "expires_in": 3600, "expires_at": int(time.time()) + 24 * 3600}, token_file)
+        env = {**os.environ, "PYTHONPATH": ROOT, "TOKEN_STORE_BACKEND": "file",
+               "SPOTIFY_API_BASE_URL": server.base_url, "SPOTIFY_RATE_LIMIT": "0", "LOG_LEVEL": "WARNING",
+               "TRACK_INDEX_PATH": os.path.join(tmp, "track_index.bin"), "SPOTIPY_CLIENT_ID": "bench",
+               "SPOTIPY_CLIENT_SECRET": "bench", "SPOTIPY_REDIRECT_URI": "http://127.0.0.1/callback",
+               "PLAYBACK_DEBOUNCE_MS": "0"}
+        port = free_port()
+        log_path = os.path.join(tmp, "app.log")
+        with open(log_path, "w") as log_file:
+            process = start_app(args, port, env, tmp, log_file)
+            try:
+                results = {}
+                for endpoint in args.endpoints:
+                    warmup = make_requests(endpoint, clips[::-1], args.warmup, rng)
+                    asyncio.run(drive(port, warmup, min(args.concurrency, max(1, args.warmup))))
+                    server.calls.clear()
+                    requests = make_requests(endpoint, clips, args.requests, rng)
+                    results[endpoint] = asyncio.run(drive(port, requests, args.concurrency))
+                    results[endpoint]["spotify_calls"] = sum(server.calls.values())
+                report["spotify_client"] = httpx.get(f"http://127.0.0.1:{port}/spotify/metrics").json()
+            finally:
+                process.terminate()
+                process.wait()
+    report["results"] = results
+    report["spotify_mock"] = {"injected_429s": server.rate_limited, "injected_errors": server.errors}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per endpoint first")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--clips", type=int, default=300, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--recognition-ms", type=float, default=50, help="stub recognizer latency")
+    parser.add_argument("--spotify-latency-ms", type=float, default=20)
+    parser.add_argument("--spotify-error-rate", type=float, default=0.0, help="share of Spotify calls that 502")
+    parser.add_argument("--spotify-429-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", default="0.1")
+    parser.add_argument("--output", help="write the JSON report here as well")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.warmup + args.requests > args.clips and "voice_command" in args.endpoints:
+        print("note: more voice requests than clips, later clips hit the recognition cache", file=sys.stderr)
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            report["comparison"] = compare(report["results"], json.load(baseline_file))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
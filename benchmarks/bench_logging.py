@@ -0,0 +1,127 @@
+"""Request throughput at INFO with the old synchronous logging and the queued pipeline.
+
+    python -m benchmarks.bench_logging --requests 2000 --concurrency 32
+    python -m benchmarks.bench_logging --write-delay-ms 0.2   # slow sink, e.g. a container log pipe
+
+Drives /spotify-search in-process against the local mock Spotify server.
+"before" writes straight to a StreamHandler from the request and replays
+the log lines the handlers used to emit (the whole search JSON and the
+request headers, bearer token included); "after" uses configure_logging().
+Both write to a file; --write-delay-ms adds a per-write stall to the sink.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_spotify_client import summarize
+from benchmarks.mock_spotify import MockSpotifyServer
+from benchmarks.ws_voice_harness import configure_app
+
+
+class SlowStream:
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def legacy_logging(stream):
+    from app import main
+    from app.services.logging_setup import stop_logging
+
+    stop_logging()
+    root = logging.getLogger()
+    root.handlers.clear()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    search_track = main.search_track
+
+    async def logged_search_track(sp, query, **kwargs):
+        headers = {"Authorization": f"Bearer {sp.access_token}"}
+        logging.info(f"Request: GET {sp.client.base_url}/search")
+        logging.info(f"Headers: {headers}")
+        result = await search_track(sp, query, **kwargs)
+        logging.info(f"Response: {json.dumps(result)}")
+        logging.info(f"Search results: {result}")
+        return result
+
+    main.search_track = logged_search_track
+    return lambda: setattr(main, "search_track", search_track)
+
+
+async def drive(app, total, concurrency, tag):
+    from app.services.spotify_client import spotify_client
+
+    latencies = []
+    queue = iter(range(total))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker():
+            for i in queue:
+                start = time.perf_counter()
+                # Unique queries so every request reaches Spotify
+                response = await client.get("/spotify-search", params={"query": f"{tag} song {i}"})
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    # The pooled client is bound to this event loop
+    await spotify_client.close()
+    return summarize(latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--spotify-latency-ms", type=float, default=5)
+    parser.add_argument("--write-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_app(server, tmp, "play test song", 1.0, 0)
+        from app.main import app
+        from app.services.logging_setup import configure_logging, stop_logging, dropped_records
+
+        for mode in ("before", "after"):
+            log_path = os.path.join(tmp, f"{mode}.log")
+            with open(log_path, "w") as log_file:
+                sink = SlowStream(log_file, args.write_delay_ms / 1000)
+                restore = legacy_logging(sink) if mode == "before" else None
+                if mode == "after":
+                    configure_logging(stream=sink)
+                results[mode] = asyncio.run(drive(app, args.requests, args.concurrency, mode))
+                # Count what was written, including what the listener still had queued
+                stop_logging()
+                if restore:
+                    restore()
+            with open(log_path) as log_file:
+                text = log_file.read()
+            results[mode]["log_bytes"] = len(text)
+            results[mode]["token_leaked"] = "Bearer harness" in text
+        results["after"]["dropped_records"] = dropped_records()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cost of the metrics instrumentation on the voice command pipeline.
+
+    python -m benchmarks.bench_metrics_overhead --requests 300 --rounds 5
+
+Drives /voice-command in-process (stub recognizer, local mock Spotify) with
+the registry enabled and disabled, alternating rounds so drift hits both
+sides equally. Also times the raw metric operations one request performs,
+which is the overhead without the end-to-end noise, and one /metrics scrape.
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+from benchmarks.mock_spotify import MockSpotifyServer
+from benchmarks.ws_voice_harness import configure_app, make_speech_wav, reset_caches
+
+
+def instrumentation_cost(iterations=20000):
+    from app.services.metrics import (REQUEST_SECONDS, REQUESTS_TOTAL, REQUESTS_IN_FLIGHT, STAGE_SECONDS,
+                                      SPOTIFY_REQUESTS_TOTAL, SPOTIFY_REQUEST_SECONDS, SPOTIFY_IN_FLIGHT)
+
+    # What one played voice command records: the HTTP request, six stages,
+    # and a search, a device lookup and a play call to Spotify
+    start = time.perf_counter()
+    for _ in range(iterations):
+        REQUESTS_IN_FLIGHT.inc()
+        for stage in ("upload", "recognition", "parse", "search", "devices", "play"):
+            STAGE_SECONDS.observe(0.003, stage=stage)
+        for method, endpoint in (("GET", "/search"), ("GET", "/me/player/devices"), ("PUT", "/me/player/play")):
+            SPOTIFY_IN_FLIGHT.inc()
+            SPOTIFY_IN_FLIGHT.dec()
+            SPOTIFY_REQUESTS_TOTAL.inc(method=method, endpoint=endpoint, status=200)
+            SPOTIFY_REQUEST_SECONDS.observe(0.02, method=method, endpoint=endpoint)
+        REQUESTS_IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(0.05, method="POST", route="/voice-command")
+        REQUESTS_TOTAL.inc(method="POST", route="/voice-command", status=200)
+    return (time.perf_counter() - start) / iterations
+
+
+def run_round(client, wav_bytes, requests):
+    latencies = []
+    for _ in range(requests):
+        reset_caches()  # every request takes the full path: recognition, search, devices
+        start = time.perf_counter()
+        response = client.post("/voice-command", params={"wait": True},
+                               files={"audio": ("clip.wav", wav_bytes, "audio/wav")})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--recognition-ms", type=float, default=5)
+    parser.add_argument("--spotify-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    from app.services.metrics import registry
+
+    wav_bytes = make_speech_wav(1.0, 0.2)
+    latencies = {True: [], False: []}
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_app(server, tmp, "play stand by me by ben e king", 1.0, args.recognition_ms)
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            run_round(client, wav_bytes, 20)  # warm up
+            for _ in range(args.rounds):
+                for enabled in (True, False):
+                    registry.enabled = enabled
+                    latencies[enabled].extend(run_round(client, wav_bytes, args.requests))
+            registry.enabled = True
+            start = time.perf_counter()
+            scrape = client.get("/metrics")
+            scrape_ms = (time.perf_counter() - start) * 1000
+
+    on, off = statistics.median(latencies[True]), statistics.median(latencies[False])
+    per_request = instrumentation_cost()
+    print(json.dumps({
+        "median_ms_metrics_on": round(on * 1000, 3),
+        "median_ms_metrics_off": round(off * 1000, 3),
+        "end_to_end_overhead_pct": round((on - off) / off * 100, 2),
+        "instrumentation_us_per_request": round(per_request * 1e6, 2),
+        "instrumentation_pct_of_request": round(per_request / off * 100, 3),
+        "scrape_ms": round(scrape_ms, 2),
+        "scrape_bytes": len(scrape.content),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Bursts of playback voice commands, run inline versus through the playback queue.
+
+    python -m benchmarks.bench_playback_queue
+    python -m benchmarks.bench_playback_queue --spotify-latency-ms 120 --gap-ms 100
+
+Sends bursts such as "volume up" x5 or three "play ..." in a row to
+/voice-command, one after another with --gap-ms between them, the way a
+user repeating themselves would. The recognizer is the corpus stub and
+Spotify is the local mock with --spotify-latency-ms per call.
+
+  inline   wait=true with no debounce window: every command is sent to
+           Spotify before its response, as before the queue
+  queued   the default 202 response; commands are debounced and coalesced
+           per device in the background
+
+Reports client-visible latency per command, Spotify calls per burst and
+the time until the burst's last command has taken effect.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import corpus as corpus_module
+from benchmarks.load_spotify_client import percentile
+from benchmarks.mock_spotify import MockSpotifyServer
+
+BURSTS = {
+    "volume_up_x5": ["volume up"] * 5,
+    "volume_mixed": ["volume up", "volume up", "set volume to 30", "turn it down", "volume up"],
+    "play_x3": ["play stand by me by ben e king", "play imagine by john lennon", "play hey jude by the beatles"],
+    "pause_resume": ["pause", "resume", "pause", "resume"],
+    "skip_x3": ["skip", "skip", "skip"],
+}
+
+
+def build_corpus():
+    rng = np.random.default_rng(3)
+    transcripts = sorted({text for burst in BURSTS.values() for text in burst})
+    clips = [{"transcript": text, "wav": corpus_module.make_clip(index, 1.0, rng)}
+             for index, text in enumerate(transcripts)]
+    return {item["transcript"]: item["wav"] for item in clips}, clips
+
+
+def configure_app(server, tmp, clips):
+    from app.services import voice_recognition
+    from app.services.rate_limit import TokenBucket
+    from app.services.spotify_auth import token_manager
+    from app.services.spotify_client import spotify_client
+    from app.services.token_store import FileTokenStore
+    from app.services.track_index import track_index
+
+    spotify_client.base_url = server.base_url
+    spotify_client.limiter = TokenBucket(0)
+    token_manager.backend = FileTokenStore(os.path.join(tmp, "token_info.json"))
+    token_manager.store({"access_token": "bench", "refresh_token": "bench", "token_type": "Bearer",
+                         "expires_in": 3600, "expires_at": int(time.time()) + 3600})
+    track_index.path = os.path.join(tmp, "track_index.bin")
+    voice_recognition.register_backend("corpus", corpus_module.stub_recognizer(clips))
+    voice_recognition.RECOGNIZER_BACKEND = "corpus"
+
+
+def wait_settled(client, job_url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = client.get(job_url).json()
+        if job["status"] == "superseded":
+            job_url = f"/playback/jobs/{job['superseded_by']}"
+        elif job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.005)
+    raise RuntimeError("playback job did not finish")
+
+
+def run_burst(client, server, wavs, texts, mode, gap_s):
+    from app.services.search_cache import search_cache
+    from app.services.voice_recognition import recognition_cache
+
+    search_cache._entries.clear()
+    recognition_cache._entries.clear()
+    calls_before = sum(server.calls.values())
+    latencies = []
+    statuses = []
+    start = time.perf_counter()
+    for text in texts:
+        sent = time.perf_counter()
+        response = client.post("/voice-command", params={"wait": mode == "inline"},
+                               files={"audio": ("clip.wav", wavs[text], "audio/wav")})
+        latencies.append(time.perf_counter() - sent)
+        statuses.append(response.status_code)
+        time.sleep(gap_s)
+    if mode == "queued":
+        wait_settled(client, response.json()["status_url"])
+    settled = time.perf_counter() - start - gap_s
+    # Device lookups are cached; what is left is search and player calls
+    return {"latencies": latencies, "statuses": statuses, "settled_s": settled,
+            "spotify_calls": sum(server.calls.values()) - calls_before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="times each burst is sent per mode")
+    parser.add_argument("--gap-ms", type=float, default=50, help="pause between commands in a burst")
+    parser.add_argument("--spotify-latency-ms", type=float, default=80)
+    parser.add_argument("--debounce-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    wavs, clips = build_corpus()
+    results = {}
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_app(server, tmp, clips)
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.services.playback_queue import playback_queue
+
+        with TestClient(app) as client:
+            for mode, debounce_ms in (("inline", 0), ("queued", args.debounce_ms)):
+                playback_queue.debounce = debounce_ms / 1000
+                results[mode] = {}
+                for name, texts in BURSTS.items():
+                    runs = [run_burst(client, server, wavs, texts, mode, args.gap_ms / 1000)
+                            for _ in range(args.repeat)]
+                    latencies_ms = [latency * 1000 for run in runs for latency in run["latencies"]]
+                    results[mode][name] = {
+                        "commands": len(texts),
+                        "statuses": sorted(set(status for run in runs for status in run["statuses"])),
+                        "p50_ms": round(percentile(latencies_ms, 50), 1),
+                        "p99_ms": round(percentile(latencies_ms, 99), 1),
+                        "spotify_calls_per_burst": statistics.fmean(run["spotify_calls"] for run in runs),
+                        "settled_ms": round(statistics.fmean(run["settled_s"] for run in runs) * 1000, 1),
+                    }
+            results["queue"] = playback_queue.stats()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Replay voice-command traces against the search cache.
+
+    python -m benchmarks.bench_search_cache --trace commands.jsonl
+    python -m benchmarks.bench_search_cache --commands 5000 --songs 500
+
+A trace is JSON lines with a "text" field holding the recognized command
+(e.g. {"text": "play blinding lights by the weeknd"}). Without --trace a
+Zipf-distributed trace is generated, since a few songs get most requests.
+Search latency is simulated so the numbers don't depend on the network.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.services.command_parser import parse_command
+from app.services.search_cache import SearchCache, search_track
+
+
+class SimulatedSpotify:
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    async def search(self, q, type="track", limit=1):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {"tracks": {"items": [{"uri": f"spotify:track:{abs(hash(q))}", "name": q}]}}
+
+
+def generate_trace(commands, songs, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(songs)]
+    picks = rng.choices(range(songs), weights=weights, k=commands)
+    # Vary case and spacing so normalization is exercised
+    return [rng.choice(["play song {0} by artist {0}", "Play  Song {0} by Artist {0}", "play song {0}"]).format(i)
+            for i in picks]
+
+
+def load_trace(path):
+    with open(path) as trace_file:
+        return [json.loads(line)["text"] for line in trace_file if line.strip()]
+
+
+async def replay(texts, cache, sp):
+    start = time.perf_counter()
+    for text in texts:
+        command = parse_command(text)
+        if command.get("action") != "play":
+            continue
+        # Skip the track index: tracks found by the first replay would
+        # otherwise answer the second without touching the cache
+        await search_track(sp, command["song_name"], command.get("artist_name"), cache=cache, use_index=False)
+    return time.perf_counter() - start
+
+
+async def run(texts, latency_ms, maxsize, ttl):
+    uncached = SimulatedSpotify(latency_ms)
+    no_cache = SearchCache(maxsize=0, ttl=ttl)
+    baseline = await replay(texts, no_cache, uncached)
+
+    cached = SimulatedSpotify(latency_ms)
+    cache = SearchCache(maxsize=maxsize, ttl=ttl)
+    elapsed = await replay(texts, cache, cached)
+
+    return {
+        "commands": len(texts),
+        "cache": cache.stats(),
+        "network_searches_without_cache": uncached.calls,
+        "network_searches_with_cache": cached.calls,
+        "total_s_without_cache": round(baseline, 3),
+        "total_s_with_cache": round(elapsed, 3),
+        "latency_saved_ms_per_command": round((baseline - elapsed) / max(len(texts), 1) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSON lines file with a 'text' field per command")
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--songs", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--maxsize", type=int, default=256)
+    parser.add_argument("--ttl", type=float, default=3600)
+    args = parser.parse_args()
+
+    texts = load_trace(args.trace) if args.trace else generate_trace(args.commands, args.songs)
+    print(json.dumps(asyncio.run(run(texts, args.latency_ms, args.maxsize, args.ttl)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
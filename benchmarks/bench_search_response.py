@@ -0,0 +1,104 @@
+"""Response size and serialization cost of /spotify-search, before and after projection.
+
+    python -m benchmarks.bench_search_response --requests 2000
+
+Serialization, per request, on the search payload the local mock returns
+(shaped like Spotify's, with markets, images and links):
+  before          the whole payload through FastAPI's default path
+                  (jsonable_encoder, then json.dumps in JSONResponse)
+  after_raw       fields=raw: the whole payload, serialized once
+  after_default   projected to uri, name and artist, serialized once
+
+Over HTTP, in-process against the mock with the search cache warm: bytes
+and latency for fields=raw, the default projection, and a repeat request
+with If-None-Match that gets a 304.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.mock_spotify import MockSpotifyServer, _track
+
+
+def per_call_us(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return round((time.perf_counter() - start) / count * 1e6, 2)
+
+
+def bench_serialization(payload, count):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from app.services.search_response import DEFAULT_SEARCH_FIELDS, dumps, project
+
+    variants = {
+        "before": lambda: JSONResponse(jsonable_encoder(payload)).body,
+        "after_raw": lambda: dumps(payload),
+        "after_default": lambda: dumps(project(payload, DEFAULT_SEARCH_FIELDS)),
+    }
+    return {name: {"bytes": len(render()), "us_per_request": per_call_us(render, count)}
+            for name, render in variants.items()}
+
+
+def configure_app(server, tmp):
+    from app.services.rate_limit import TokenBucket
+    from app.services.spotify_auth import token_manager
+    from app.services.spotify_client import spotify_client
+    from app.services.token_store import FileTokenStore
+    from app.services.track_index import track_index
+
+    spotify_client.base_url = server.base_url
+    spotify_client.limiter = TokenBucket(0)
+    token_manager.backend = FileTokenStore(os.path.join(tmp, "token_info.json"))
+    token_manager.store({"access_token": "bench", "refresh_token": "bench", "token_type": "Bearer",
+                         "expires_in": 3600, "expires_at": int(time.time()) + 3600})
+    track_index.path = os.path.join(tmp, "track_index.bin")
+
+
+def bench_http(client, query, count):
+    results = {}
+    for name, params in (("raw", {"fields": "raw"}), ("default", {})):
+        response = client.get("/spotify-search", params={"query": query, **params})
+        etag = response.headers["etag"]
+        start = time.perf_counter()
+        for _ in range(count):
+            client.get("/spotify-search", params={"query": query, **params})
+        elapsed = time.perf_counter() - start
+        results[name] = {"status": response.status_code, "body_bytes": len(response.content),
+                         "ms_per_request": round(elapsed / count * 1000, 3)}
+
+    not_modified = client.get("/spotify-search", params={"query": query}, headers={"If-None-Match": etag})
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get("/spotify-search", params={"query": query}, headers={"If-None-Match": etag})
+    results["not_modified"] = {"status": not_modified.status_code, "body_bytes": len(not_modified.content),
+                               "ms_per_request": round((time.perf_counter() - start) / count * 1000, 3)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--query", default="track:stand by me artist:ben e king")
+    args = parser.parse_args()
+
+    payload = {"tracks": {"href": "", "items": [_track(args.query)], "limit": 1, "offset": 0, "total": 1}}
+    results = {"serialization": bench_serialization(payload, args.requests * 5)}
+
+    with MockSpotifyServer(latency_ms=0) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_app(server, tmp)
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            results["http"] = bench_http(client, args.query, args.requests)
+        results["spotify_search_calls"] = server.calls.get("GET /v1/search", 0)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
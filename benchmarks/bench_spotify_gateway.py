@@ -0,0 +1,136 @@
+"""Exercise the Spotify gateway against the local mock with injected 429s and latency.
+
+    python -m benchmarks.bench_spotify_gateway
+    python -m benchmarks.bench_spotify_gateway --latency-ms 50 --rate-limit-rate 0.3
+
+Scenarios:
+  coalescing    identical concurrent searches and device lookups share one call
+  rate_limited  a share of calls get 429 + Retry-After; all requests still succeed
+  limiter       the token bucket holds the call rate to its budget
+  long_retry    a Retry-After beyond the max wait fails fast instead of hanging
+Each prints its numbers and whether its check passed; exits non-zero on a failure.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.services.spotify_client import SpotifyException
+
+from app.services.spotify_client import SpotifyClient
+from benchmarks import mock_spotify
+from benchmarks.mock_spotify import MockSpotifyServer
+
+
+def reset_mock(latency_ms, rate_limit_rate=0.0, retry_after="1"):
+    state = mock_spotify.app.state
+    state.calls = {}
+    state.rate_limited = 0
+    state.latency_ms = latency_ms
+    state.rate_limit_rate = rate_limit_rate
+    state.retry_after = retry_after
+
+
+async def coalescing(base_url, args):
+    reset_mock(args.latency_ms)
+    client = SpotifyClient(base_url=base_url, rate_limit=0)
+    sp = client.for_token("bench")
+    calls = [sp.search(q="track:stand by me", limit=1) for _ in range(args.concurrency)]
+    calls += [sp.devices() for _ in range(args.concurrency)]
+    results = await asyncio.gather(*calls)
+    await client.close()
+    upstream = sum(mock_spotify.app.state.calls.values())
+    return {
+        "requests": len(results),
+        "upstream_calls": upstream,
+        "coalescing": client.stats()["coalescing"],
+        "passed": upstream == 2 and all(results),
+    }
+
+
+async def rate_limited(base_url, args):
+    reset_mock(args.latency_ms, args.rate_limit_rate, args.retry_after)
+    client = SpotifyClient(base_url=base_url, rate_limit=0, max_retries=5, backoff_base=0.05)
+    sp = client.for_token("bench")
+    failures = 0
+
+    async def call(i):
+        nonlocal failures
+        try:
+            await sp.search(q=f"track:song {i}", limit=1)
+        except SpotifyException:
+            failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return {
+        "requests": args.requests,
+        "injected_429s": mock_spotify.app.state.rate_limited,
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        **{key: value for key, value in client.stats().items() if key != "coalescing"},
+        "passed": failures == 0 and client.retries > 0,
+    }
+
+
+async def limiter(base_url, args):
+    reset_mock(0)
+    rate, burst = 50, 10
+    client = SpotifyClient(base_url=base_url, rate_limit=rate, rate_burst=burst)
+    sp = client.for_token("bench")
+    start = time.perf_counter()
+    await asyncio.gather(*(sp.search(q=f"track:limited {i}", limit=1) for i in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    minimum = (args.requests - burst) / rate
+    return {
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "expected_min_s": minimum,
+        "observed_rate": round(args.requests / elapsed, 1),
+        "limiter": client.limiter.stats(),
+        "passed": elapsed >= minimum * 0.95,
+    }
+
+
+async def long_retry(base_url, args):
+    reset_mock(0, 1.0, "60")
+    client = SpotifyClient(base_url=base_url, rate_limit=0, max_retry_wait=10)
+    sp = client.for_token("bench")
+    start = time.perf_counter()
+    status = None
+    try:
+        await sp.devices()
+    except SpotifyException as e:
+        status = e.http_status
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return {"status": status, "elapsed_s": round(elapsed, 3), "passed": status == 429 and elapsed < 1}
+
+
+async def run(base_url, args):
+    return {scenario.__name__: await scenario(base_url, args)
+            for scenario in (coalescing, rate_limited, limiter, long_retry)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.2)
+    parser.add_argument("--retry-after", default="0.1")
+    args = parser.parse_args()
+
+    with MockSpotifyServer() as server:
+        results = asyncio.run(run(server.base_url, args))
+    print(json.dumps(results, indent=2))
+    if not all(result["passed"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark for the in-memory Spotify token cache.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_token_cache
+
+Compares the old behaviour (read and parse token_info.json on every request)
+with TokenManager, and checks that a burst of concurrent requests against an
+expired token triggers exactly one refresh.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.spotify_auth import TokenManager
+
+
+class FakeOAuth:
+    """Stands in for SpotifyOAuth; refresh takes `latency` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def refresh_access_token(self, refresh_token):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.latency)
+        return {
+            "access_token": f"access-{n}",
+            "refresh_token": refresh_token,
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "expires_at": int(time.time()) + 3600,
+        }
+
+
+def write_token(path, expires_at):
+    with open(path, "w") as token_file:
+        json.dump({"access_token": "access-0", "refresh_token": "refresh",
+                   "token_type": "Bearer", "expires_in": 3600, "expires_at": expires_at}, token_file)
+
+
+def legacy_get_token(path, counters):
+    # What get_spotify_token used to do on every request
+    counters["reads"] += 1
+    with open(path) as token_file:
+        token_info = json.load(token_file)
+    return token_info["access_token"]
+
+
+def bench_reads(path, requests):
+    write_token(path, int(time.time()) + 3600)
+    counters = {"reads": 0}
+    start = time.perf_counter()
+    for _ in range(requests):
+        legacy_get_token(path, counters)
+    legacy_elapsed = time.perf_counter() - start
+
+    manager = TokenManager(path=path, oauth_factory=lambda: FakeOAuth(0))
+    start = time.perf_counter()
+    for _ in range(requests):
+        manager.get_access_token()
+    cached_elapsed = time.perf_counter() - start
+    manager.close()
+
+    return {
+        "requests": requests,
+        "legacy_reads_per_request": counters["reads"] / requests,
+        "cached_reads_per_request": manager.backend.reads / requests,
+        "legacy_us_per_request": legacy_elapsed / requests * 1e6,
+        "cached_us_per_request": cached_elapsed / requests * 1e6,
+    }
+
+
+def bench_burst(path, concurrency, refresh_latency):
+    write_token(path, int(time.time()) - 10)
+    oauth = FakeOAuth(refresh_latency)
+    manager = TokenManager(path=path, oauth_factory=lambda: oauth)
+    barrier = threading.Barrier(concurrency)
+
+    def request():
+        barrier.wait()
+        return manager.get_access_token()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        tokens = list(pool.map(lambda _: request(), range(concurrency)))
+    manager.close()
+
+    return {
+        "concurrency": concurrency,
+        "refresh_calls": oauth.calls,
+        "file_writes": manager.backend.writes,
+        "distinct_tokens_returned": len(set(tokens)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--refresh-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "token_info.json")
+        reads = bench_reads(path, args.requests)
+        burst = bench_burst(path, args.concurrency, args.refresh_latency)
+
+    print(json.dumps({"reads": reads, "burst": burst}, indent=2))
+    assert burst["refresh_calls"] == 1, "expected exactly one refresh under a concurrent burst"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Token lookups for thousands of users across several uvicorn workers.
+
+    python -m benchmarks.bench_token_store --users 5000 --workers 4 --requests 10000
+    TOKEN_STORE_DSN=postgresql://... python -m benchmarks.bench_token_store --backend postgres
+
+Seeds the token store with --users tokens, starts `uvicorn app.main:app
+--workers N` with MULTI_USER=1 against the local mock Spotify server, and
+sends /spotify-search requests as random users (X-Session-Id header). Runs
+once with the per-worker read-through cache (TOKEN_CACHE_SIZE) and once
+with it disabled, which is every lookup hitting the database. The mock
+records which bearer tokens it saw, to check each user's own token was used.
+
+The in-process part times TokenManager lookups directly from several
+threads, with and without the cache, and counts how many reach the store.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.load_spotify_client import summarize
+from benchmarks.mock_spotify import MockSpotifyServer, free_port, app as mock_app
+
+
+def seed(store, users):
+    expires_at = int(time.time()) + 3600
+    tokens = {f"user-{i}": {"access_token": f"token-{i}", "refresh_token": f"refresh-{i}", "token_type": "Bearer",
+                            "expires_in": 3600, "expires_at": expires_at} for i in range(users)}
+    if hasattr(store, "put_many"):
+        store.put_many(tokens)
+    else:
+        for user_id, token_info in tokens.items():
+            store.put(user_id, token_info)
+    store.close()
+
+
+def bench_lookups(make_store, users, lookups, threads, cache_size):
+    from app.services.spotify_auth import TokenManager
+
+    manager = TokenManager(backend=make_store(), cache_size=cache_size)
+    per_thread = lookups // threads
+
+    def run(seed_value):
+        rng = random.Random(seed_value)
+        for _ in range(per_thread):
+            assert manager.get_access_token(f"user-{rng.randrange(users)}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, range(threads)))
+    elapsed = time.perf_counter() - start
+    total = per_thread * threads
+    store_reads = manager.backend.stats()["reads"]
+    manager.close()
+    return {"lookups": total, "us_per_lookup": round(elapsed / total * 1e6, 2),
+            "store_reads_per_lookup": round(store_reads / total, 4)}
+
+
+def start_app(port, workers, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"], env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("app did not start")
+
+
+async def drive(port, users, total, concurrency, tag):
+    latencies = []
+    errors = 0
+    requested = set()
+    queue = iter(range(total))
+    rng = random.Random(11)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in queue:
+                user_id = f"user-{rng.randrange(users)}"
+                requested.add(user_id)
+                headers = {"X-Session-Id": user_id}
+                start = time.perf_counter()
+                response = await client.get("/spotify-search", params={"query": f"{tag} {i}"}, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        results = summarize(latencies, time.perf_counter() - start)
+    results["errors"] = errors
+    results["distinct_users"] = len(requested)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--spotify-latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    from app.services.token_store import PostgresTokenStore, SQLiteTokenStore
+
+    results = {}
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "tokens.db")
+        make_store = (lambda: SQLiteTokenStore(db_path)) if args.backend == "sqlite" else PostgresTokenStore
+        seed(make_store(), args.users)
+        modes = (("db_every_request", 0), ("read_through_cache", args.users * 2))
+        for mode, cache_size in modes:
+            results[f"in_process_{mode}"] = bench_lookups(make_store, args.users, args.requests * 5, 8, cache_size)
+
+        for mode, cache_size in modes:
+            env = {**os.environ, "MULTI_USER": "1", "TOKEN_STORE_BACKEND": args.backend, "TOKEN_STORE_PATH": db_path,
+                   "TOKEN_CACHE_SIZE": str(cache_size), "SPOTIFY_API_BASE_URL": server.base_url,
+                   "SPOTIFY_RATE_LIMIT": "0", "LOG_LEVEL": "WARNING",
+                   "TRACK_INDEX_PATH": os.path.join(tmp, "track_index.bin")}
+            mock_app.state.tokens = set()
+            port = free_port()
+            process = start_app(port, args.workers, env)
+            try:
+                results[mode] = asyncio.run(drive(port, args.users, args.requests, args.concurrency, mode))
+            finally:
+                process.terminate()
+                process.wait()
+            seen = {token for token in mock_app.state.tokens if token.startswith("Bearer token-")}
+            results[mode]["distinct_user_tokens_seen"] = len(seen)
+
+    print(json.dumps({"backend": args.backend, "users": args.users, "workers": args.workers, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
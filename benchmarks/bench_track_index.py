@@ -0,0 +1,160 @@
+"""Lookup latency and recall of the local track index on a synthetic catalog.
+
+    python -m benchmarks.bench_track_index --tracks 100000 --queries 2000
+
+Titles and artists are built from a pseudo-word vocabulary. Queries are
+corrupted the way recognition gets them wrong: a dropped or added "the",
+a misheard letter, a sound-alike spelling, or a missing artist. The index
+is saved, memory-mapped back in and then queried, as it is at startup.
+
+Before that, a small real catalog checks that partial titles and wrong
+artists are left to Spotify search ("love" must not resolve to "Love
+Story"); any failing case is printed and the run exits non-zero.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from app.services.track_index import TrackIndex
+
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+SOUND_ALIKES = [("ph", "f"), ("ck", "k"), ("c", "k"), ("ee", "ea"), ("y", "ie"), ("s", "z"), ("oo", "u")]
+
+
+def pseudo_word(rng):
+    return "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 3)))
+
+
+def make_catalog(rng, tracks):
+    vocabulary = list({pseudo_word(rng) for _ in range(6000)})
+    artists = [" ".join(rng.sample(vocabulary, rng.randint(1, 2))) for _ in range(tracks // 20)]
+    catalog = []
+    for i in range(tracks):
+        title = " ".join(rng.sample(vocabulary, rng.randint(1, 4)))
+        if rng.random() < 0.15:
+            title = "the " + title
+        catalog.append((f"spotify:track:{i:022d}", title, rng.choice(artists)))
+    return catalog
+
+
+KNOWN_TRACKS = [
+    ("Love Story", "Taylor Swift"), ("Yellow Submarine", "The Beatles"), ("Shape of You", "Ed Sheeran"),
+    ("Stand by Me", "Ben E. King"), ("Yellow", "Coldplay"), ("Hey Jude", "The Beatles"),
+]
+# (spoken title, spoken artist, expected title or None for a fall back to search)
+CORRECTNESS_CASES = [
+    ("love", None, None),
+    ("yellow", None, "Yellow"),
+    ("yellow", "the beatles", None),
+    ("shape", None, None),
+    ("shape", "ed sheeran", None),
+    ("love story", None, "Love Story"),
+    ("love story", "taylor swift", "Love Story"),
+    ("yellow submarine", None, "Yellow Submarine"),
+    ("the yellow submarine", "beatles", "Yellow Submarine"),
+    ("shape of you", "ed sheeran", "Shape of You"),
+    ("shape of you", "adele", None),
+    ("stand by me", "ben e king", "Stand by Me"),
+    ("hey jude", "coldplay", None),
+]
+
+
+def check_correctness(tmp):
+    index = TrackIndex(path=os.path.join(tmp, "known.bin"))
+    for i, (title, artist) in enumerate(KNOWN_TRACKS):
+        index.add(f"spotify:track:known{i}", title, artist)
+    failures = []
+    for title, artist, expected in CORRECTNESS_CASES:
+        match = index.lookup(title, artist)
+        found = match[0]["name"] if match else None
+        if found != expected:
+            failures.append({"query": title, "artist": artist, "expected": expected, "found": found})
+    return failures
+
+
+def corrupt(rng, title, artist):
+    kind = rng.choice(["exact", "the", "letter", "sound", "no_artist"])
+    words = title.split()
+    if kind == "the":
+        words = words[1:] if words[0] == "the" else ["the"] + words
+    elif kind == "letter":
+        index = rng.randrange(len(words))
+        word = words[index]
+        position = rng.randrange(len(word))
+        words[index] = word[:position] + rng.choice(CONSONANTS + VOWELS) + word[position + 1:]
+    elif kind == "sound":
+        joined = " ".join(words)
+        for original, replacement in rng.sample(SOUND_ALIKES, len(SOUND_ALIKES)):
+            if original in joined:
+                joined = joined.replace(original, replacement, 1)
+                break
+        words = joined.split()
+    return kind, " ".join(words), (None if kind == "no_artist" else artist)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = make_catalog(rng, args.tracks)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_correctness(tmp)
+        path = os.path.join(tmp, "track_index.bin")
+        index = TrackIndex(path=path)
+        start = time.perf_counter()
+        for uri, title, artist in catalog:
+            index.add(uri, title, artist)
+        index.save()
+        build_s = time.perf_counter() - start
+        file_bytes = os.path.getsize(path)
+
+        start = time.perf_counter()
+        index = TrackIndex(path=path).load()
+        load_ms = (time.perf_counter() - start) * 1000
+
+        latencies, correct, wrong, by_kind = [], 0, 0, {}
+        for uri, title, artist in rng.sample(catalog, args.queries):
+            kind, spoken_title, spoken_artist = corrupt(rng, title, artist)
+            start = time.perf_counter()
+            match = index.lookup(spoken_title, spoken_artist)
+            latencies.append(time.perf_counter() - start)
+            hit = match is not None and match[0]["uri"] == uri
+            correct += hit
+            # A wrong local match plays the wrong song; a miss only costs a search
+            wrong += match is not None and not hit
+            total, hits = by_kind.get(kind, (0, 0))
+            by_kind[kind] = (total + 1, hits + hit)
+        index.close()
+
+    latencies.sort()
+    print(json.dumps({
+        "tracks": args.tracks,
+        "queries": args.queries,
+        "build_and_save_s": round(build_s, 2),
+        "file_mb": round(file_bytes / 1e6, 2),
+        "mmap_load_ms": round(load_ms, 1),
+        "lookup_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "lookup_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+        "lookup_mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "recall_at_1": round(correct / args.queries, 3),
+        "wrong_match_rate": round(wrong / args.queries, 3),
+        "recall_by_noise": {kind: round(hits / total, 3) for kind, (total, hits) in by_kind.items()},
+        "correctness_failures": failures,
+    }, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Synthetic voice-command corpus: WAV clips paired with their transcripts.
+
+    python -m benchmarks.corpus --out corpus/ --clips 200
+
+Each clip is a tone-modulated noise burst between short silences. The
+tone's frequency encodes the clip's index, so stub_recognizer() can tell
+which transcript a clip stands for after the app has decoded, resampled
+and trimmed it, the same way a real recognizer sees the audio. Clip
+lengths vary, and every clip's noise is different, so no two clips share
+a recognition cache entry.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BASE_HZ = 200.0
+STEP_HZ = 15.0
+MAX_CLIPS = int((SAMPLE_RATE / 2 - 500 - BASE_HZ) / STEP_HZ)
+
+SONGS = [
+    ("stand by me", "ben e king"), ("bohemian rhapsody", "queen"), ("hotel california", "eagles"),
+    ("billie jean", "michael jackson"), ("imagine", "john lennon"), ("wonderwall", "oasis"),
+    ("smells like teen spirit", "nirvana"), ("rolling in the deep", "adele"), ("hey jude", "the beatles"),
+    ("take on me", "a ha"), ("blinding lights", "the weeknd"), ("shape of you", "ed sheeran"),
+    ("superstition", "stevie wonder"), ("dancing queen", "abba"), ("purple rain", "prince"),
+    ("baby", "justin bieber"), ("no song here notfound", "nobody"),
+]
+# (weight, template) for spoken commands; {song} and {artist} come from SONGS
+COMMANDS = [
+    (8, "play {song} by {artist}"), (3, "play {song}"), (2, "pause"), (2, "resume"), (2, "skip"),
+    (1, "previous song"), (2, "volume up"), (2, "turn it down"), (1, "set volume to {volume}"),
+    (1, "queue {song} by {artist}"),
+]
+
+
+def tone_hz(index):
+    return BASE_HZ + STEP_HZ * index
+
+
+def index_from_samples(samples, sample_rate):
+    """The clip index encoded in a clip's dominant frequency."""
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(samples.size)))
+    peak_hz = np.argmax(spectrum[1:]) + 1
+    peak_hz *= sample_rate / samples.size
+    return int(round((peak_hz - BASE_HZ) / STEP_HZ))
+
+
+def make_clip(index, seconds, rng):
+    speech = int(seconds * SAMPLE_RATE)
+    silence = np.zeros(int(0.15 * SAMPLE_RATE))
+    t = np.arange(speech) / SAMPLE_RATE
+    samples = 0.4 * np.sin(2 * np.pi * tone_hz(index) * t) + rng.normal(0, 0.05, speech)
+    samples = np.concatenate([silence, samples, silence])
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def make_transcript(rng):
+    template = rng.choices([t for _, t in COMMANDS], weights=[w for w, _ in COMMANDS])[0]
+    song, artist = rng.choice(SONGS)
+    return template.format(song=song, artist=artist, volume=rng.randrange(0, 101, 5))
+
+
+def generate(clips=200, seed=1, min_seconds=0.8, max_seconds=2.5):
+    """A list of {"index", "transcript", "seconds", "wav"} dicts."""
+    if clips > MAX_CLIPS:
+        raise ValueError(f"At most {MAX_CLIPS} clips fit below the Nyquist frequency")
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    corpus = []
+    for index in range(clips):
+        seconds = round(rng.uniform(min_seconds, max_seconds), 2)
+        corpus.append({"index": index, "transcript": make_transcript(rng), "seconds": seconds,
+                       "wav": make_clip(index, seconds, noise)})
+    return corpus
+
+
+def search_queries(rng, count):
+    return [f"track:{song} artist:{artist}" if rng.random() < 0.7 else song
+            for song, artist in (rng.choice(SONGS) for _ in range(count))]
+
+
+def stub_recognizer(corpus):
+    """A recognizer backend that returns each corpus clip's transcript."""
+    transcripts = [item["transcript"] for item in corpus]
+
+    def recognize(recognizer, audio):
+        samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype="<i2").astype(np.float32)
+        index = index_from_samples(samples, audio.sample_rate)
+        if not 0 <= index < len(transcripts):
+            raise ValueError(f"Audio does not match a corpus clip (index {index})")
+        return transcripts[index]
+
+    return recognize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory for the WAV files and manifest.json")
+    parser.add_argument("--clips", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = []
+    for item in generate(args.clips, args.seed):
+        name = f"clip_{item['index']:04d}.wav"
+        with open(os.path.join(args.out, name), "wb") as wav_file:
+            wav_file.write(item["wav"])
+        manifest.append({"file": name, "transcript": item["transcript"], "seconds": item["seconds"]})
+    with open(os.path.join(args.out, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    print(f"Wrote {len(manifest)} clips to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Load test for the shared Spotify HTTP client against a local mock server.
+
+    python -m benchmarks.load_spotify_client --requests 2000 --concurrency 50
+
+"before" issues a blocking requests.get from inside each coroutine, the way the
+handlers used to; "after" goes through the pooled, keep-alive SpotifyClient.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import requests
+
+from app.services.spotify_client import SpotifyClient
+from benchmarks.mock_spotify import MockSpotifyServer
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "requests_per_sec": len(latencies) / elapsed,
+    }
+
+
+async def drive(call, total, concurrency):
+    latencies = []
+    queue = iter(range(total))
+
+    async def worker():
+        for _ in queue:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def run(base_url, total, concurrency):
+    headers = {"Authorization": "Bearer bench"}
+
+    async def blocking_call():
+        # Old behaviour: a new connection per call, blocking the event loop
+        requests.get(f"{base_url}/me/player/devices", headers=headers)
+
+    # Limiter off: this measures connection handling, not the rate budget
+    client = SpotifyClient(base_url=base_url, max_connections=concurrency, max_keepalive_connections=concurrency,
+                           rate_limit=0)
+    sp = client.for_token("bench")
+
+    async def pooled_call():
+        await sp.devices()
+
+    before = await drive(blocking_call, total, concurrency)
+    after = await drive(pooled_call, total, concurrency)
+    await client.close()
+    return {"before": before, "after": after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    with MockSpotifyServer(latency_ms=args.latency_ms) as server:
+        results = asyncio.run(run(server.base_url, args.requests, args.concurrency))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Local mock of the Spotify Web API endpoints this app uses.
+
+Serve it standalone with:
+
+    MOCK_SPOTIFY_LATENCY_MS=20 uvicorn benchmarks.mock_spotify:app --port 8900
+
+and point the app at it with SPOTIFY_API_BASE_URL=http://127.0.0.1:8900/v1.
+MOCK_SPOTIFY_429_RATE makes that share of calls answer 429 with a
+Retry-After of MOCK_SPOTIFY_RETRY_AFTER seconds, and MOCK_SPOTIFY_ERROR_RATE
+makes that share answer 502 as an upstream outage would.
+"""
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from benchmarks.corpus import SONGS
+
+LATENCY_MS = float(os.getenv("MOCK_SPOTIFY_LATENCY_MS", "0"))
+RATE_LIMIT_RATE = float(os.getenv("MOCK_SPOTIFY_429_RATE", "0"))
+RETRY_AFTER = os.getenv("MOCK_SPOTIFY_RETRY_AFTER", "1")
+ERROR_RATE = float(os.getenv("MOCK_SPOTIFY_ERROR_RATE", "0"))
+
+app = FastAPI(title="Mock Spotify")
+app.state.latency_ms = LATENCY_MS
+app.state.calls = {}
+app.state.rate_limit_rate = RATE_LIMIT_RATE
+app.state.retry_after = RETRY_AFTER
+app.state.rate_limited = 0
+app.state.error_rate = ERROR_RATE
+app.state.errors = 0
+app.state.tokens = set()
+_rng = random.Random(7)
+
+
+CATALOGUE = dict(SONGS)
+# Spotify lists every market a track is available in, ~185 of them
+MARKETS = [a + b for a in "ABCDEFGHIJKLMNOPQRSTUVWXYZ" for b in "AEIMORTUZ"][:185]
+
+
+def _artist(name):
+    slug = "".join(c for c in name.lower() if c.isalnum()) or "mock"
+    return {"external_urls": {"spotify": f"https://open.spotify.com/artist/{slug}"},
+            "href": f"https://api.spotify.com/v1/artists/{slug}", "id": slug, "name": name,
+            "type": "artist", "uri": f"spotify:artist:{slug}"}
+
+
+def _known_song(title):
+    # The longest catalogue title in the query, the way Spotify ranks a full title match first
+    words = f" {' '.join(title.lower().split())} "
+    matches = [song for song in CATALOGUE if f" {song} " in words]
+    return max(matches, key=len) if matches else None
+
+
+def _track(query):
+    """A track shaped like Spotify's search results, with the same bulk (markets, images, links).
+
+    Titles in the corpus catalogue come back with their real artist; any
+    other query is echoed back as a track by "Mock Artist".
+    """
+    title = query.split(" artist:")[0].replace("track:", "").strip()
+    song = _known_song(title)
+    if song is not None:
+        title = song
+    slug = "".join(c for c in title.lower() if c.isalnum())[:22] or "unknown"
+    artists = [_artist(CATALOGUE[song] if song is not None else "Mock Artist")]
+    return {
+        "album": {
+            "album_type": "album", "artists": artists, "available_markets": MARKETS,
+            "external_urls": {"spotify": f"https://open.spotify.com/album/{slug}"},
+            "href": f"https://api.spotify.com/v1/albums/{slug}", "id": slug,
+            "images": [{"url": f"https://i.scdn.co/image/{slug}{size}", "height": size, "width": size}
+                       for size in (640, 300, 64)],
+            "name": "Mock Album", "release_date": "1999-01-01", "release_date_precision": "day",
+            "total_tracks": 12, "type": "album", "uri": f"spotify:album:{slug}",
+        },
+        "artists": artists,
+        "available_markets": MARKETS,
+        "disc_number": 1,
+        "duration_ms": 200000,
+        "explicit": False,
+        "external_ids": {"isrc": "USMOCK0000001"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{slug}"},
+        "href": f"https://api.spotify.com/v1/tracks/{slug}",
+        "id": slug,
+        "is_local": False,
+        "name": title,
+        "popularity": 70,
+        "preview_url": None,
+        "track_number": 1,
+        "type": "track",
+        "uri": f"spotify:track:{slug}",
+    }
+
+
+@app.middleware("http")
+async def simulate_latency(request: Request, call_next):
+    key = f"{request.method} {request.url.path}"
+    app.state.calls[key] = app.state.calls.get(key, 0) + 1
+    app.state.tokens.add(request.headers.get("authorization", ""))
+    if app.state.latency_ms:
+        await asyncio.sleep(app.state.latency_ms / 1000)
+    if app.state.rate_limit_rate and _rng.random() < app.state.rate_limit_rate:
+        app.state.rate_limited += 1
+        return JSONResponse({"error": {"status": 429, "message": "API rate limit exceeded"}}, status_code=429,
+                            headers={"Retry-After": str(app.state.retry_after)})
+    if app.state.error_rate and _rng.random() < app.state.error_rate:
+        app.state.errors += 1
+        return JSONResponse({"error": {"status": 502, "message": "Bad gateway"}}, status_code=502)
+    return await call_next(request)
+
+
+@app.get("/v1/search")
+async def search(q: str, type: str = "track", limit: int = 1):
+    items = [] if "notfound" in q.lower() else [_track(q)]
+    return {"tracks": {"href": "", "items": items[:limit], "limit": limit, "offset": 0, "total": len(items)}}
+
+
+@app.get("/v1/me/player/devices")
+async def devices():
+    return {"devices": [{"id": "mock-device-1", "is_active": True, "name": "Mock Speaker",
+                         "type": "Speaker", "volume_percent": 50}]}
+
+
+@app.get("/v1/me/tracks")
+async def saved_tracks(limit: int = 50, offset: int = 0):
+    return {"items": [], "limit": limit, "offset": offset, "total": 0}
+
+
+@app.get("/v1/me/player/recently-played")
+async def recently_played(limit: int = 50):
+    return {"items": [], "limit": limit}
+
+
+@app.get("/v1/me/player")
+async def playback_state():
+    return {"device": {"id": "mock-device-1", "is_active": True, "volume_percent": 50}, "is_playing": True}
+
+
+@app.put("/v1/me/player/play")
+@app.put("/v1/me/player/pause")
+@app.put("/v1/me/player/volume")
+@app.post("/v1/me/player/next")
+@app.post("/v1/me/player/previous")
+@app.post("/v1/me/player/queue")
+async def player_command():
+    return Response(status_code=204)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MockSpotifyServer:
+    """Runs the mock app with uvicorn in a background thread."""
+
+    def __init__(self, port=None, latency_ms=LATENCY_MS, rate_limit_rate=RATE_LIMIT_RATE, retry_after=RETRY_AFTER,
+                 error_rate=ERROR_RATE):
+        self.port = port or free_port()
+        app.state.error_rate = error_rate
+        app.state.latency_ms = latency_ms
+        app.state.rate_limit_rate = rate_limit_rate
+        app.state.retry_after = retry_after
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def calls(self):
+        return app.state.calls
+
+    @property
+    def rate_limited(self):
+        return app.state.rate_limited
+
+    @property
+    def errors(self):
+        return app.state.errors
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
@@ -0,0 +1,156 @@
+"""Stream a WAV file in frames to /ws/voice-command and compare with /voice-command.
+
+    python -m benchmarks.ws_voice_harness --seconds 3 --frame-ms 100
+    python -m benchmarks.ws_voice_harness --wav my_clip.wav
+
+Runs the real app in-process against the local mock Spotify server, with a
+stub recognizer that reveals the transcript word by word as more audio
+arrives and takes --recognition-ms per call. Frames are sent in real time
+as if captured live. Reported latency is what the user perceives: time from
+the end of speech to the final response.
+"""
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from benchmarks.mock_spotify import MockSpotifyServer
+
+
+def make_speech_wav(seconds, tail_seconds, sample_rate=16000):
+    rng = np.random.default_rng(5)
+    # Voice-like noise followed by the silence a client captures before endpointing
+    samples = np.concatenate([rng.normal(0, 0.2, int(seconds * sample_rate)),
+                              rng.normal(0, 0.0005, int(tail_seconds * sample_rate))])
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def streaming_stub(transcript, total_seconds, latency_s):
+    words = transcript.split()
+
+    def recognize(recognizer, audio):
+        time.sleep(latency_s)
+        # Preprocessing has trimmed silence, so this is seconds of speech heard
+        heard = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        count = max(1, min(len(words), int(round(len(words) * heard / total_seconds))))
+        return " ".join(words[:count])
+
+    return recognize
+
+
+def configure_app(server, tmp, transcript, seconds, recognition_ms):
+    from app.services import voice_recognition
+    from app.services.spotify_auth import token_manager
+    from app.services.spotify_client import spotify_client
+    from app.services.track_index import track_index
+    from app.services.rate_limit import TokenBucket
+    from app.services.token_store import FileTokenStore
+    from app.services.playback_queue import playback_queue
+
+    spotify_client.base_url = server.base_url
+    spotify_client.limiter = TokenBucket(0)  # the mock has no rate budget to protect
+    token_manager.backend = FileTokenStore(os.path.join(tmp, "token_info.json"))
+    token_manager.store({"access_token": "harness", "refresh_token": "harness", "token_type": "Bearer",
+                         "expires_in": 3600, "expires_at": int(time.time()) + 3600})
+    track_index.path = os.path.join(tmp, "track_index.bin")
+    voice_recognition.register_backend("streaming_stub", streaming_stub(transcript, seconds, recognition_ms / 1000))
+    voice_recognition.RECOGNIZER_BACKEND = "streaming_stub"
+    # One command at a time has nothing to coalesce with; don't time the debounce
+    playback_queue.debounce = 0
+
+
+def reset_caches():
+    from app.services.device_cache import device_cache
+    from app.services.search_cache import search_cache
+    from app.services.track_index import track_index
+    from app.services.voice_recognition import recognition_cache
+
+    search_cache._entries.clear()
+    recognition_cache._entries.clear()
+    device_cache.clear()
+    track_index._reset()
+
+
+def run_upload(client, wav_bytes, seconds):
+    time.sleep(seconds)  # the whole utterance is captured before upload starts
+    start = time.perf_counter()
+    # wait=true so the upload, like the stream, returns after the command has run
+    response = client.post("/voice-command", params={"wait": True},
+                           files={"audio": ("clip.wav", wav_bytes, "audio/wav")})
+    return time.perf_counter() - start, response.json()
+
+
+def run_stream(client, wav_bytes, frame_ms):
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+        rate, channels, width = wav_file.getframerate(), wav_file.getnchannels(), wav_file.getsampwidth()
+        pcm = wav_file.readframes(wav_file.getnframes())
+    frame_bytes = int(rate * frame_ms / 1000) * channels * width
+
+    events = []
+    with client.websocket_connect("/ws/voice-command") as ws:
+        ws.send_text(json.dumps({"sample_rate": rate, "channels": channels, "sample_width": width}))
+        for offset in range(0, len(pcm), frame_bytes):
+            ws.send_bytes(pcm[offset:offset + frame_bytes])
+            time.sleep(frame_ms / 1000)
+        ws.send_text("end")
+        start = time.perf_counter()
+        while True:
+            message = ws.receive_json()
+            events.append(message["event"])
+            if message["event"] in ("final", "error"):
+                return time.perf_counter() - start, message, events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wav", help="16-bit PCM WAV to stream instead of generated audio")
+    parser.add_argument("--seconds", type=float, default=3.0, help="seconds of speech")
+    parser.add_argument("--tail-silence", type=float, default=0.8)
+    parser.add_argument("--frame-ms", type=int, default=100)
+    parser.add_argument("--transcript", default="play stand by me by ben e king")
+    parser.add_argument("--recognition-ms", type=float, default=300)
+    parser.add_argument("--spotify-latency-ms", type=float, default=80)
+    args = parser.parse_args()
+
+    if args.wav:
+        with open(args.wav, "rb") as wav_file:
+            wav_bytes = wav_file.read()
+        with wave.open(io.BytesIO(wav_bytes), "rb") as wav_file:
+            seconds = wav_file.getnframes() / wav_file.getframerate()
+    else:
+        seconds = args.seconds
+        wav_bytes = make_speech_wav(seconds, args.tail_silence)
+
+    with MockSpotifyServer(latency_ms=args.spotify_latency_ms) as server, tempfile.TemporaryDirectory() as tmp:
+        configure_app(server, tmp, args.transcript, seconds, args.recognition_ms)
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            reset_caches()
+            upload_latency, upload_result = run_upload(client, wav_bytes, seconds + args.tail_silence)
+            reset_caches()
+            stream_latency, stream_result, events = run_stream(client, wav_bytes, args.frame_ms)
+
+    print(json.dumps({
+        "speech_seconds": round(seconds, 2),
+        "upload": {"perceived_latency_ms": round(upload_latency * 1000, 1), "response": upload_result.get("response")},
+        "stream": {"perceived_latency_ms": round(stream_latency * 1000, 1), "response": stream_result.get("response"),
+                   "speculation": stream_result.get("speculation"), "events": events,
+                   "timings": stream_result.get("timings")},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()